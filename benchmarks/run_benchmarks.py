@@ -0,0 +1,153 @@
+"""Time the hot paths on a synthetic addon tree
+
+    generates a tree with synthetic_tree.py (or uses an existing one),
+    then times discovery, parsing, tokenizing, closure building and
+    reduction separately. every phase runs several times, the fastest
+    run is reported. results are printed as json, so they can be
+    stored and compared across versions.
+
+    usage: python run_benchmarks.py [--addons N] [--repeat N] [--tree DIR] [--output FILE]
+    """
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+import dependencies
+from classes.addon import decode_description, tokenize_description
+from classes.dependency_matrix import DependencyMatrix
+from synthetic_tree import generate_tree
+# pylint: enable=import-error,wrong-import-position
+
+
+
+def best_of ( repeat, function ):
+    """run function repeat times, return (fastest seconds, last result)"""
+    best = None
+    result = None
+    for _ in range ( repeat ):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+
+def phase ( seconds, count, unit ):
+    """compile the result entry of one phase"""
+    return {
+        "seconds": round ( seconds, 6 ),
+        unit: count,
+        f"{unit}_per_second": round ( count / seconds, 1 ) if seconds else None
+    }
+
+
+
+def run ( tree, repeat, workers ):
+    """time all phases on the tree, return the results dict"""
+    results = {}
+
+    seconds, files = best_of ( repeat, lambda: list (
+        dependencies.find_valid_addon_description_files ( tree )
+    ) )
+    results["discover"] = phase ( seconds, len ( files ), "files" )
+
+    seconds, addons = best_of ( repeat, lambda: dependencies.read_addon_info_files (
+        files, workers=1
+    ) )
+    # count files in both parse phases, duplicate copies are parsed too
+    results["parse"] = phase ( seconds, len ( files ), "manifests" )
+
+    if workers != 1:
+        seconds, _ = best_of ( repeat, lambda: dependencies.read_addon_info_files (
+            files, workers=workers
+        ) )
+        results["parse_parallel"] = phase ( seconds, len ( files ), "manifests" )
+
+    raw = []
+    for description_file in files:
+        with open ( description_file, "rb" ) as file:
+            raw.append ( file.read() )
+    seconds, texts = best_of ( repeat, lambda: [ decode_description ( data ) [0] for data in raw ] )
+    results["decode"] = phase ( seconds, len ( raw ), "manifests" )
+    results["decode"]["bytes"] = sum ( len ( data ) for data in raw )
+
+    seconds, _ = best_of ( repeat, lambda: [ tokenize_description ( text ) for text in texts ] )
+    results["tokenize"] = phase ( seconds, len ( texts ), "manifests" )
+
+    seconds, matrix = best_of ( repeat, lambda: DependencyMatrix ( addons ) )
+    results["matrix"] = phase ( seconds, len ( addons ), "addons" )
+    edges = sum ( len ( mandatory ) + len ( optional ) for mandatory, optional in matrix.edges.values() )
+    results["matrix"]["edges"] = edges
+
+    def closure():
+        matrix.mandatory_reach = {}
+        matrix.full_reach = {}
+        matrix.compute_closure ( list ( matrix.addons ) )
+    seconds, _ = best_of ( repeat, closure )
+    results["closure"] = phase ( seconds, len ( matrix.addons ), "addons" )
+
+    def reduction():
+        for addon_id in matrix.addons:
+            matrix.reduce_addon ( addon_id )
+    seconds, _ = best_of ( repeat, reduction )
+    results["reduce"] = phase ( seconds, len ( matrix.addons ), "addons" )
+
+    return results
+
+
+
+def main():
+    """generate a tree, run the benchmarks and print the json report"""
+    parser = argparse.ArgumentParser ( description="Benchmark the dependency checker." )
+    parser.add_argument ( "--addons", type=int, default=2000 )
+    parser.add_argument ( "--libraries", type=int, default=400 )
+    parser.add_argument ( "--seed", type=int, default=0 )
+    parser.add_argument ( "--repeat", type=int, default=3 )
+    parser.add_argument ( "--workers", type=int, default=1, help="also time parallel parsing" )
+    parser.add_argument ( "--tree", help="use this addon folder instead of generating one" )
+    parser.add_argument ( "--output", help="write the report to this file" )
+    arguments = parser.parse_args()
+
+    parameters = vars ( arguments )
+    if arguments.tree:
+        # the generator settings do not describe a given tree
+        for name in ( "addons", "libraries", "seed" ):
+            del parameters [ name ]
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+    }
+    if arguments.tree:
+        report["results"] = run ( arguments.tree, arguments.repeat, arguments.workers )
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            tree = join ( directory, "AddOns" )
+            report["tree"] = generate_tree (
+                tree,
+                addons=arguments.addons,
+                libraries=arguments.libraries,
+                seed=arguments.seed
+            )
+            report["results"] = run ( tree, arguments.repeat, arguments.workers )
+
+    text = json.dumps ( report, indent=2 )
+    if arguments.output:
+        with open ( arguments.output, "w", encoding="utf-8" ) as file:
+            file.write ( text )
+    print ( text )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Write synthetic ESO addon folders for benchmarking
+
+    creates libraries, addons using them, deep dependency chains,
+    diamonds, cycles, version constrained edges, missing dependencies,
+    libraries nested inside other addons, mixed file encodings and
+    color coded titles. the same seed always creates the same tree.
+
+    usage: python synthetic_tree.py TARGET [--addons N] [--libraries N] [--seed N]
+    """
+
+import argparse
+import random
+from os import makedirs
+from os.path import join
+
+# encodings used for description files, with their share of files
+ENCODINGS = (
+    ( "ascii", 60 ),
+    ( "utf-8", 20 ),
+    ( "utf-8-sig", 10 ),
+    ( "utf-16", 5 ),
+    ( "cp1252", 5 ),
+)
+COLORS = ( "FF0000", "00FF00", "3399FF", "FFD700" )
+API_VERSIONS = "101041 101042"
+
+
+
+def write_description ( root, folder, fields, encoding="ascii", extension=".txt" ):
+    """write folder/folder.txt below root with the given directives"""
+    directory = join ( root, folder )
+    makedirs ( directory, exist_ok=True )
+    lines = [ f"## {key}: {value}" for key, value in fields if value ]
+    lines.extend ( ( "", f"{folder.split ( '/' ) [-1]}.lua", "" ) )
+    text = "\r\n".join ( lines )
+    if encoding == "ascii":
+        # non ascii content is what makes the other encodings interesting
+        text = text.encode ( "ascii", errors="replace" ).decode ( "ascii" )
+    name = folder.split ( "/" ) [-1]
+    with open ( join ( directory, name + extension ), "wb" ) as file:
+        file.write ( text.encode ( encoding ) )
+
+
+
+def pick_encoding ( rng ):
+    """pick an encoding according to ENCODINGS"""
+    return rng.choices (
+        [ encoding for encoding, _ in ENCODINGS ],
+        [ weight for _, weight in ENCODINGS ]
+    ) [0]
+
+
+
+def colored ( rng, title ):
+    """wrap parts of a title in color codes"""
+    words = title.split ( " " )
+    return " ".join (
+        f"|c{rng.choice ( COLORS )}{word}|r" if rng.random() < 0.5 else word
+        for word in words
+    )
+
+
+
+def dependency ( rng, name, versions ):
+    """return a dependency string, sometimes with a version constraint"""
+    if rng.random() < 0.3:
+        return f"{name}>={rng.randint ( 1, versions [ name ] + 2 )}"
+    return name
+
+
+
+# pylint: disable=too-many-locals
+def generate_tree ( root, addons=1000, libraries=200, chain_depth=25, diamonds=20,
+                    cycles=10, missing_ratio=0.02, seed=0 ):
+    """write a synthetic addon tree below root, return counts of what was written"""
+    rng = random.Random ( seed )
+    versions = {}
+    library_names = [ f"LibSynthetic{index:04d}" for index in range ( libraries ) ]
+    for name in library_names:
+        versions [ name ] = rng.randint ( 1, 40 )
+
+    # libraries depend on libraries with a lower index, so they form a dag
+    for index, name in enumerate ( library_names ):
+        depends = [
+            dependency ( rng, library_names [ other ], versions )
+            for other in rng.sample ( range ( index ), min ( index, rng.randint ( 0, 3 ) ) )
+        ]
+        write_description ( root, name, (
+            ( "Title", colored ( rng, f"{name} Library Über" ) ),
+            ( "Author", "Synthetic Ävthor" ),
+            ( "AddOnVersion", versions [ name ] ),
+            ( "APIVersion", API_VERSIONS ),
+            ( "IsLibrary", "true" if rng.random() < 0.5 else "" ),
+            ( "DependsOn", " ".join ( depends ) ),
+        ), pick_encoding ( rng ) )
+
+    # deep chain: Chain0000 -> Chain0001 -> ...
+    for index in range ( chain_depth ):
+        following = f"Chain{index + 1:04d}" if index + 1 < chain_depth else ""
+        write_description ( root, f"Chain{index:04d}", (
+            ( "Title", f"Chain link {index}" ),
+            ( "DependsOn", following ),
+        ) )
+
+    # diamonds: top -> left, right -> bottom
+    for index in range ( diamonds ):
+        prefix = f"Diamond{index:03d}"
+        write_description ( root, prefix + "Top", (
+            ( "Title", f"{prefix} top" ),
+            ( "DependsOn", f"{prefix}Left {prefix}Right" ),
+        ) )
+        for side in ( "Left", "Right" ):
+            write_description ( root, prefix + side, (
+                ( "Title", f"{prefix} {side}" ),
+                ( "DependsOn", f"{prefix}Bottom>=2" ),
+            ) )
+        write_description ( root, prefix + "Bottom", (
+            ( "Title", f"{prefix} bottom" ),
+            ( "AddOnVersion", "3" ),
+        ) )
+
+    # cycles of three, one optional edge in every other cycle
+    for index in range ( cycles ):
+        members = [ f"Cycle{index:03d}{part}" for part in "ABC" ]
+        for position, name in enumerate ( members ):
+            target = members [ ( position + 1 ) % 3 ]
+            optional = index % 2 and position == 2
+            write_description ( root, name, (
+                ( "Title", name ),
+                ( "DependsOn", "" if optional else target ),
+                ( "OptionalDependsOn", target if optional else "" ),
+            ) )
+
+    # regular addons using libraries, some missing, some with nested libraries
+    nested = 0
+    for index in range ( addons ):
+        name = f"Addon{index:05d}"
+        depends = [
+            dependency ( rng, library, versions )
+            for library in rng.sample ( library_names, min ( libraries, rng.randint ( 0, 6 ) ) )
+        ]
+        optional = [
+            dependency ( rng, library, versions )
+            for library in rng.sample ( library_names, min ( libraries, rng.randint ( 0, 3 ) ) )
+        ]
+        if rng.random() < missing_ratio:
+            depends.append ( f"LibMissing{rng.randint ( 0, 9 )}" )
+        write_description ( root, name, (
+            ( "Title", colored ( rng, f"Synthetic Addon {index} – Ünïcode" ) ),
+            ( "Author", "@synthetic" ),
+            ( "Version", f"1.{index % 10}.{index % 7}" ),
+            ( "AddOnVersion", index % 50 + 1 ),
+            ( "APIVersion", API_VERSIONS ),
+            ( "Description", "Adds: nothing: at all" ),
+            ( "SavedVariables", f"{name}_SavedVariables" if rng.random() < 0.4 else "" ),
+            ( "DependsOn", " ".join ( depends ) ),
+            ( "OptionalDependsOn", " ".join ( optional ) ),
+        ), pick_encoding ( rng ), ".addon" if rng.random() < 0.1 else ".txt" )
+        if rng.random() < 0.05:
+            nested += 1
+            write_description ( root, f"{name}/libs/LibBundled{index:05d}", (
+                ( "Title", f"LibBundled{index:05d}" ),
+                ( "IsLibrary", "true" ),
+            ) )
+
+    return {
+        "libraries": libraries,
+        "addons": addons,
+        "chain_depth": chain_depth,
+        "diamonds": diamonds,
+        "cycles": cycles,
+        "nested": nested,
+        "total": libraries + addons + chain_depth + 4 * diamonds + 3 * cycles + nested
+    }
+# pylint: enable=too-many-locals
+
+
+
+def main():
+    """write a synthetic tree to the folder given on the command line"""
+    parser = argparse.ArgumentParser ( description="Write a synthetic ESO addon folder." )
+    parser.add_argument ( "target", help="folder to write the addons to" )
+    parser.add_argument ( "--addons", type=int, default=1000 )
+    parser.add_argument ( "--libraries", type=int, default=200 )
+    parser.add_argument ( "--chain-depth", type=int, default=25 )
+    parser.add_argument ( "--seed", type=int, default=0 )
+    arguments = parser.parse_args()
+    print ( generate_tree (
+        arguments.target,
+        addons=arguments.addons,
+        libraries=arguments.libraries,
+        chain_depth=arguments.chain_depth,
+        seed=arguments.seed
+    ) )
+
+if __name__ == "__main__":
+    main()
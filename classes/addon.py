@@ -1,38 +1,161 @@
 """Provides a class to handle Addon information"""
 
+import codecs
+import re
+from array import array
 from pathlib import Path
-import chardet
 
-from classes.dependency import Dependency
+from classes.dependency import Dependency, parse_version_key
+from classes.instrumentation import LOGGER, STATS
+from classes.name_table import NAMES
 
-DATA_DESIGNATOR = "## "
 COLOR_MARKER = "|"
 
+# one "## Key: Value" directive per line. the key ends at the first colon,
+# the value may contain further colons. trailing whitespace is dropped.
+DIRECTIVE_PATTERN = re.compile (
+    r"^##[ \t]*([^:\r\n]+?)[ \t]*:[ \t]*(.+?)[ \t\r]*$", re.MULTILINE
+)
+# every line that is neither empty nor a directive or a "#" or ";" comment names a file
+FILE_PATTERN = re.compile ( r"^[ \t]*([^#;\s][^\r\n]*?)[ \t\r]*$", re.MULTILINE )
+# |cRRGGBB starts a color, |r resets it
+COLOR_PATTERN = re.compile ( r"\|[cC][0-9a-fA-F]{6}|\|[rR]" )
+
+# byte order marks and their codecs, utf-32 has to be checked before utf-16
+BYTE_ORDER_MARKS = (
+    ( codecs.BOM_UTF8, "utf-8-sig" ),
+    ( codecs.BOM_UTF32_LE, "utf-32" ),
+    ( codecs.BOM_UTF32_BE, "utf-32" ),
+    ( codecs.BOM_UTF16_LE, "utf-16" ),
+    ( codecs.BOM_UTF16_BE, "utf-16" ),
+)
+# number of bytes chardet gets to see if a file is no valid utf-8
+ENCODING_SAMPLE_SIZE = 4096
+# used if chardet cannot tell, this is what windows editors write
+FALLBACK_ENCODING = "cp1252"
+
+
+
+def decode_description ( rawdata ):
+    """decode the raw content of a description file.
+       checks for a byte order mark, then tries strict utf-8 (which includes
+       plain ascii) and only runs chardet on a sample if both fail.
+       returns a tuple (text, encoding)
+    """
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if rawdata.startswith ( bom ):
+            return rawdata.decode ( encoding, errors="replace" ), encoding
+    if rawdata.isascii():
+        return rawdata.decode ( "ascii" ), "ascii"
+    try:
+        return rawdata.decode ( "utf-8" ), "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    # chardet is slow to import and slow to run, only pay for it when needed
+    import chardet # pylint: disable=import-outside-toplevel
+    STATS.count ( "chardet fallbacks" )
+    encoding = chardet.detect ( rawdata [ :ENCODING_SAMPLE_SIZE ] )['encoding']
+    if encoding is None or encoding == "ascii":
+        # the sample did not contain the interesting bytes
+        encoding = FALLBACK_ENCODING
+    try:
+        return rawdata.decode ( encoding, errors="replace" ), encoding
+    except LookupError:
+        return rawdata.decode ( FALLBACK_ENCODING, errors="replace" ), FALLBACK_ENCODING
+
+
+
+def tokenize_description ( text ):
+    """extract all directives from the decoded text of a description file
+       in a single pass. returns a list of (key, value) tuples in file order.
+    """
+    return DIRECTIVE_PATTERN.findall ( text )
+
+
+
+def strip_color_information ( line ):
+    """strip embedded color information from a string in linear time"""
+    if COLOR_MARKER not in line:
+        return line
+    return COLOR_PATTERN.sub ( "", line )
+
+
+
+def select_installed_copies ( addons ):
+    """pick the copy of every addon that counts as installed.
+       libraries are often bundled by several addons, so the same addon may
+       be found more than once. like the game, the copy with the highest
+       AddOnVersion wins, see Addon.supersedes. returns a dict name -> addon
+       in the order the addons were first found.
+    """
+    chosen = {}
+    for addon in addons:
+        current = chosen.get ( addon.get_addon_id() )
+        if current is None:
+            chosen [ addon.get_addon_id() ] = addon
+            continue
+        STATS.count ( "duplicate copies" )
+        if addon.supersedes ( current ):
+            chosen [ addon.get_addon_id() ] = addon
+        STATS.trace (
+            "duplicate %s: using %s", addon.get_name(),
+            chosen [ addon.get_addon_id() ].get_description_file()
+        )
+    return { addon.get_name(): addon for addon in chosen.values() }
+
+
+
 # dafuq, this is a real world model, splitting this in "easier" classes
 # just would it make more complex.
 # pylint: disable=too-many-instance-attributes
 class Addon:
     """Process and store addon information"""
 
-    name = ""
-    title = ""                  # Title
-    description = ""            # Description
-    author = ""                 # Author
-    contributors = []           # Contributors
-    version = ""                # Version
-    addon_version = ""          # AddOnVersion
-    api_versions = []           # APIVersion
-    last_updated = ""           # Last Updated
-    saved_variables = False     # SavedVariables
-    library = None              # is_library
-    depends_on = []             # DependsOn
-    optional_depends_on = []    # OptionalDependsOn
+    # bump whenever fields are added, removed or change their meaning.
+    # persisted addon data with a different model version is discarded.
+    MODEL_VERSION = 6
+
+    __slots__ = (
+        "name",
+        "addon_id",                 # interned id of name
+        "title",                    # Title
+        "description",              # Description
+        "author",                   # Author
+        "contributors",             # Contributors
+        "version",                  # Version
+        "addon_version",            # AddOnVersion
+        "addon_version_key",        # AddOnVersion as integer, None if missing or invalid
+        "api_versions",             # APIVersion
+        "last_updated",             # Last Updated
+        "saved_variables",          # SavedVariables, the variable names
+        "library",                  # is_library
+        "depends_on",               # DependsOn
+        "depends_on_ids",           # interned ids of DependsOn
+        "optional_depends_on",      # OptionalDependsOn
+        "optional_depends_on_ids",  # interned ids of OptionalDependsOn
+        "encoding",                 # encoding the description file was read with
+        "description_file",         # path of the description file
+        "files"                     # files listed in the description file
+    )
+
+
+
+    def __init__(self, text=None):
+        """constructor: Parse text information and initialize object"""
+        self.clear()
+        if text is not None:
+            self.parse (text)
+
 
+    def __getstate__(self):
+        # ids are only valid within one process, pickle names instead
+        return self.to_dict()
 
 
-    def __init__(self, text):
-        """constructor: Parse text information and initialize object"""
-        self.parse (text)
+    def __setstate__(self, state):
+        self.clear()
+        self.set_fields ( state )
 
 
     def __repr__(self):
@@ -48,7 +171,7 @@ class Addon:
         result = result + template.format( "Author", self.author)
         result = result + template.format( "Contributors", ", ".join ( self.contributors ) )
         result = result + template.format( "is library", 'yes' if ( self.is_library() ) else 'no' )
-        result = result + template.format( "has saved variables", 'yes' if ( self.saved_variables ) else 'no')
+        result = result + template.format( "has saved variables", 'yes' if ( self.has_saved_variables() ) else 'no')
         cache = []
         for dep in self.depends_on:
             cache.append(dep.get_name())
@@ -66,18 +189,83 @@ class Addon:
     def clear(self):
         """clear all fields"""
         self.name = ""
+        self.addon_id = None
         self.title = ""
         self.description = ""
         self.author = ""
         self.contributors = []
         self.version = ""
-        self.addon_version = ""
+        self.set_addon_version ( "" )
         self.api_versions = []
         self.last_updated = ""
-        self.saved_variables = False
+        self.saved_variables = []
         self.library = None
         self.depends_on = []
+        self.depends_on_ids = array ( "l" )
         self.optional_depends_on = []
+        self.optional_depends_on_ids = array ( "l" )
+        self.encoding = None
+        self.description_file = None
+        self.files = []
+
+
+
+    def to_dict ( self ):
+        """return all parsed fields as a dict of plain values"""
+        return {
+            "name": self.name,
+            "title": self.title,
+            "description": self.description,
+            "author": self.author,
+            "contributors": list ( self.contributors ),
+            "version": self.version,
+            "addon_version": self.addon_version,
+            "api_versions": list ( self.api_versions ),
+            "last_updated": self.last_updated,
+            "saved_variables": list ( self.saved_variables ),
+            "library": self.library,
+            "depends_on": [ dep.to_dict() for dep in self.depends_on ],
+            "optional_depends_on": [ dep.to_dict() for dep in self.optional_depends_on ],
+            "encoding": self.encoding,
+            "description_file": self.description_file,
+            "files": list ( self.files )
+        }
+
+
+    @classmethod
+    def from_dict ( cls, data ):
+        """create an addon from a dict returned by to_dict, without parsing"""
+        addon = cls()
+        addon.set_fields ( data )
+        return addon
+
+
+    def set_fields ( self, data ):
+        """set all fields from a dict returned by to_dict"""
+        self.set_name ( data["name"] )
+        self.title = data["title"]
+        self.description = data["description"]
+        self.author = data["author"]
+        self.contributors = list ( data["contributors"] )
+        self.version = data["version"]
+        self.set_addon_version ( data["addon_version"] )
+        self.api_versions = list ( data["api_versions"] )
+        self.last_updated = data["last_updated"]
+        self.saved_variables = list ( data["saved_variables"] )
+        self.library = data["library"]
+        self.depends_on = [ Dependency.from_dict ( dep ) for dep in data["depends_on"] ]
+        self.depends_on_ids = array (
+            "l", ( dep.get_target_id() for dep in self.depends_on )
+        )
+        self.optional_depends_on = [
+            Dependency.from_dict ( dep ) for dep in data["optional_depends_on"]
+        ]
+        self.optional_depends_on_ids = array (
+            "l", ( dep.get_target_id() for dep in self.optional_depends_on )
+        )
+        self.encoding = data["encoding"]
+        self.description_file = data["description_file"]
+        self.files = list ( data["files"] )
 
 
 
@@ -94,33 +282,33 @@ class Addon:
             Previously stored data will be overwritten.
             Return True on success, False on failure
         """
+        with STATS.phase ( "read" ):
+            with open ( filename, "rb" ) as file:
+                rawdata = file.read()
+        STATS.count ( "files" )
+        STATS.count ( "bytes", len ( rawdata ) )
+        self.parse_data ( filename, rawdata )
+
+
+    def parse_data(self, filename, rawdata):
+        """ Parse the raw content of an addon description file.
+            filename is only used to determine the addon name.
+        """
         self.clear()
 
         # extract name and title from filename
         # might get overwritten by values found in file
-        self.name = Path ( filename ).stem
+        self.set_name ( Path ( filename ).stem )
         self.title = self.name
+        self.description_file = str ( filename )
 
-        # Dear pylint. You have to decide on whether to complain about
-        # not specifying an encoding in the with clause, or to complain
-        # about a regular open to find that encoding.
-        # pylint: disable=consider-using-with
-        file = open(filename, "rb")
-        # pylint: enable=consider-using-with
-        rawdata = file.read()
-        encoding = chardet.detect(rawdata)['encoding']
-        file.close()
-
-        with open( filename, encoding=encoding ) as file:
-            lines = file.readlines()
-
-        for line in lines:
-            if line.startswith ( DATA_DESIGNATOR ):
-                line = line[3:] # remove data designator
-                line = line.rstrip() # remove newline
-                kvp = line.split ( ": " )
-                if 2 == len ( kvp ): # only consider valid lines
-                    self.set_data ( kvp[0], kvp[1] )
+        with STATS.phase ( "detect-encoding" ):
+            text, self.encoding = decode_description ( rawdata )
+        with STATS.phase ( "tokenize" ):
+            for field, value in tokenize_description ( text ):
+                self.set_data ( field, value )
+            self.files = FILE_PATTERN.findall ( text )
+        STATS.trace ( "parsed %s (%s)", self.name, self.encoding )
 
 
 
@@ -129,55 +317,18 @@ class Addon:
            - only recognizes official field names by design
            - not tolerant to case errors in data field names by design
         """
-        match field.strip():
-            case "Title":
-                self.set_title ( value )
-            case "Author":
-                self.set_author ( value )
-            case "Contributors":
-                self.set_contributors ( value )
-            case "Description":
-                self.set_description ( value )
-            case "Version":
-                self.set_version ( value )
-            case "AddOnVersion":
-                self.set_addon_version ( value )
-            case "APIVersion":
-                self.set_api_version ( value )
-            case "Last Updated":
-                self.set_last_updated ( value )
-            case "IsLibrary":
-                self.set_library ( value )
-            case "DependsOn":
-                self.set_depends_on_from_string ( value )
-            case "OptionalDependsOn":
-                self.set_optional_depends_on_from_string ( value)
-            case "SavedVariables":
-                # If there is any entry in saved variables,
-                # set the flag to True
-                self.set_saved_variables ( True )
-            case _:
-                print ( f"unknown data field: {field} in {self.name}" )
-                return False
-
-
+        setter = self.FIELD_SETTERS.get ( field.strip() )
+        if setter is None:
+            LOGGER.info ( "unknown data field: %s in %s", field, self.name )
+            return False
+        setter ( self, value )
+        return True
 
 
 
     def strip_color_information ( self, line ):
         """strip embedded color information from a string"""
-        while COLOR_MARKER in line:
-            # find position of |
-            pos = line.find ( COLOR_MARKER)
-            # check marker type
-            end_marker = "r" == line [ pos+1 ]
-            if not end_marker:
-                # color marker, strip 8 chars
-                line = line [:pos] + line [ pos+8: ]
-            else:
-                # end marker, strip 2 chars
-                line = line [:pos] + line [ pos+2: ]
-        return line
+        return strip_color_information ( line )
 
 
 
@@ -206,8 +357,12 @@ class Addon:
         """Return the addon's name"""
         return self.name
     def set_name ( self, value):
-        """set this addon's name"""
+        """set this addon's name, interning it"""
         self.name = value
+        self.addon_id = NAMES.intern ( value )
+    def get_addon_id ( self ):
+        """Return the interned id of the addon's name"""
+        return self.addon_id
 
 
     def get_title ( self ):
@@ -252,6 +407,10 @@ class Addon:
     def set_addon_version ( self, value):
         """set this addon's AddOnVersion"""
         self.addon_version = value
+        self.addon_version_key = parse_version_key ( value )
+    def get_addon_version_key ( self ):
+        """Return the addon's AddOnVersion as integer, None if missing or invalid"""
+        return self.addon_version_key
 
 
 
@@ -266,10 +425,33 @@ class Addon:
 
     def has_saved_variables ( self ):
         """Return whether the addon declared saved variables"""
+        return bool ( self.saved_variables )
+    def get_saved_variables ( self ):
+        """Return the names of this addon's saved variables"""
         return self.saved_variables
     def set_saved_variables ( self, value):
-        """set this addon's saved variables flag"""
-        self.saved_variables = value
+        """set the names of this addon's saved variables"""
+        self.saved_variables = list ( value )
+    def set_saved_variables_from_string ( self, value):
+        """add the names of a SavedVariables entry to this addon's saved variables"""
+        # names are separated by whitespace, the entry may be repeated
+        for name in value.split():
+            if name not in self.saved_variables:
+                self.saved_variables.append ( name )
+
+
+
+    def get_encoding ( self ):
+        """Return the encoding the description file was read with"""
+        return self.encoding
+
+    def get_description_file ( self ):
+        """Return the path of the description file, None if not parsed from a file"""
+        return self.description_file
+
+    def get_files ( self ):
+        """Return the files listed in the description file, as written there"""
+        return self.files
 
 
 
@@ -278,7 +460,7 @@ class Addon:
         return self.api_versions
     def set_api_version ( self, value):
         """Populate this addon's api versions array from string"""
-        self.api_versions = value.split ( " " )
+        self.api_versions = value.split ()
     def add_api_version ( self, value):
         """Add an API version to this addon's api versions array"""
         self.api_versions.append ( value )
@@ -291,7 +473,7 @@ class Addon:
     def set_contributors ( self, value):
         """Populate this addon's api versions array from string"""
         self.contributors = []
-        for contributor in value.split ( " " ):
+        for contributor in value.split ():
             self.add_contributor ( contributor )
     def add_contributor ( self, value):
         """Add a contributor to this addon's api contributors array"""
@@ -322,13 +504,18 @@ class Addon:
     def set_depends_on_from_string ( self, value):
         """Populate this addon's dependencies array from string"""
         self.depends_on = []
-        for dep in value.split ( " " ):
+        self.depends_on_ids = array ( "l" )
+        for dep in value.split ():
             self.add_depends_on_from_string ( dep )
     def add_depends_on_from_string ( self, value):
         """Add a dependency to this addon's dependencies  array"""
         dependency = Dependency( value )
         if dependency is not None:
             self.depends_on.append ( dependency )
+            self.depends_on_ids.append ( dependency.get_target_id() )
+    def get_depends_on_ids ( self ):
+        """Return the interned ids of the addon's dependencies"""
+        return self.depends_on_ids
 
     def get_optional_depends_on ( self ):
         """Return addon's optional dependencies array"""
@@ -336,14 +523,65 @@ class Addon:
     def set_optional_depends_on_from_string ( self, value):
         """Populate this addon's optional dependencies array from string"""
         self.optional_depends_on = []
-        for dep in value.split ( " " ):
+        self.optional_depends_on_ids = array ( "l" )
+        for dep in value.split ():
             self.add_optional_depends_on_from_string ( dep )
     def add_optional_depends_on_from_string ( self, value):
         """Add an optional dependency to this addon's optional dependencies array"""
         dependency = Dependency( value )
         if dependency is not None:
             self.optional_depends_on.append ( dependency )
+            self.optional_depends_on_ids.append ( dependency.get_target_id() )
+    def get_optional_depends_on_ids ( self ):
+        """Return the interned ids of the addon's optional dependencies"""
+        return self.optional_depends_on_ids
 
     def get_combined_dependencies ( self ):
         """get mandatory and optional dependencies in one list"""
-        return self.get_depends_on () + self.get_optional_depends_on()
\ No newline at end of file
+        return self.get_depends_on () + self.get_optional_depends_on()
+
+    def supersedes ( self, other ):
+        """return whether this copy of an addon is used instead of other.
+           the higher AddOnVersion wins, a missing or invalid one counts as
+           lowest. on a tie the copy nested less deeply wins, so a library
+           installed on its own beats one bundled inside another addon,
+           otherwise other is kept.
+        """
+        own_key = -1 if self.addon_version_key is None else self.addon_version_key
+        other_key = -1 if other.addon_version_key is None else other.addon_version_key
+        if own_key != other_key:
+            return own_key > other_key
+        if self.description_file is None or other.description_file is None:
+            return False
+        own_depth = len ( Path ( self.description_file ).parts )
+        return own_depth < len ( Path ( other.description_file ).parts )
+
+    def get_fingerprint ( self ):
+        """return everything dependency checks depend on: the versions and
+           the dependencies with their constraints. addons with equal
+           fingerprints give the same results, whatever else differs.
+        """
+        return (
+            self.version,
+            self.addon_version,
+            tuple ( ( dep.key, dep.min_version, dep.max_version ) for dep in self.depends_on ),
+            tuple ( ( dep.key, dep.min_version, dep.max_version ) for dep in self.optional_depends_on )
+        )
+
+
+
+    # description file directives and the methods handling them
+    FIELD_SETTERS = {
+        "Title": set_title,
+        "Author": set_author,
+        "Contributors": set_contributors,
+        "Description": set_description,
+        "Version": set_version,
+        "AddOnVersion": set_addon_version,
+        "APIVersion": set_api_version,
+        "Last Updated": set_last_updated,
+        "IsLibrary": set_library,
+        "DependsOn": set_depends_on_from_string,
+        "OptionalDependsOn": set_optional_depends_on_from_string,
+        "SavedVariables": set_saved_variables_from_string,
+    }
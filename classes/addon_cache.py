@@ -0,0 +1,130 @@
+"""provides a persistent cache for parsed addon description files"""
+
+import hashlib
+import json
+import sqlite3
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.addon import Addon
+from classes.instrumentation import STATS
+# pylint: enable=import-error
+
+
+def file_digest ( filename ):
+    """return the content hash of a file"""
+    with open ( filename, "rb" ) as file:
+        return hashlib.blake2b ( file.read(), digest_size=16 ).hexdigest()
+
+
+
+class AddonCache:
+    """stores parsed addon data in an sqlite file
+       entries are keyed by the description file path and validated by
+       mtime and size. if those changed, the content hash decides whether
+       the file really needs to be parsed again.
+    """
+
+    # bump whenever the table layout changes.
+    # the stored version also includes Addon.MODEL_VERSION,
+    # so changes to the addon model force a rebuild as well.
+    SCHEMA_VERSION = 1
+
+    connection = None
+
+
+    def __init__(self, filename):
+        """open or create the cache file, dropping it on version mismatch"""
+        self.connection = sqlite3.connect ( filename )
+        self.hits = 0
+        self.misses = 0
+        version = self.SCHEMA_VERSION << 16 | Addon.MODEL_VERSION
+        stored = self.connection.execute ( "PRAGMA user_version" ).fetchone()[0]
+        if stored != version:
+            self.connection.execute ( "DROP TABLE IF EXISTS addons" )
+        self.connection.execute (
+            "CREATE TABLE IF NOT EXISTS addons ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " data TEXT NOT NULL )"
+        )
+        self.connection.execute ( f"PRAGMA user_version = {version}" )
+        self.connection.commit()
+
+
+    def __repr__(self):
+        return f"AddonCache ({self.hits} hits, {self.misses} misses)"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+    def lookup ( self, path, file_stat ):
+        """return the cached addon for path, or None if it has to be parsed.
+           an entry with a different mtime or size is still used if the
+           content hash did not change.
+        """
+        row = self.connection.execute (
+            "SELECT mtime_ns, size, hash, data FROM addons WHERE path = ?", ( path, )
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            STATS.count ( "cache misses" )
+            return None
+        mtime_ns, size, content_hash, data = row
+        if mtime_ns != file_stat.st_mtime_ns or size != file_stat.st_size:
+            if content_hash != file_digest ( path ):
+                self.misses += 1
+                STATS.count ( "cache misses" )
+                return None
+            self.connection.execute (
+                "UPDATE addons SET mtime_ns = ?, size = ? WHERE path = ?",
+                ( file_stat.st_mtime_ns, file_stat.st_size, path )
+            )
+        self.hits += 1
+        STATS.count ( "cache hits" )
+        return Addon.from_dict ( json.loads ( data ) )
+
+
+    def store ( self, path, file_stat, addon, content_hash=None ):
+        """store the parsed addon for path"""
+        if content_hash is None:
+            content_hash = file_digest ( path )
+        self.connection.execute (
+            "INSERT OR REPLACE INTO addons VALUES ( ?, ?, ?, ?, ? )",
+            (
+                path,
+                file_stat.st_mtime_ns,
+                file_stat.st_size,
+                content_hash,
+                json.dumps ( addon.to_dict() )
+            )
+        )
+
+
+    def evict ( self, keep_paths ):
+        """remove all entries whose path is not in keep_paths"""
+        keep_paths = set ( keep_paths )
+        stale = [
+            ( path, ) for ( path, ) in self.connection.execute ( "SELECT path FROM addons" )
+            if path not in keep_paths
+        ]
+        self.connection.executemany ( "DELETE FROM addons WHERE path = ?", stale )
+        return len ( stale )
+
+
+    def close ( self ):
+        """write pending changes and close the cache file"""
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
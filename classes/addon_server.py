@@ -0,0 +1,182 @@
+"""provides a local http server answering queries on a dependency matrix"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.dependency_matrix import DependencyMatrix
+from classes.instrumentation import LOGGER, STATS
+# pylint: enable=import-error
+
+
+class AddonServer ( ThreadingHTTPServer ):
+    """keeps the matrix of an addon folder in memory and answers queries.
+       every request runs in its own thread and works on the matrix that
+       was current when it arrived. a reload builds a new matrix next to
+       the old one and swaps the reference when done, so readers never
+       wait for it. reloads are serialized, only changed description files
+       are parsed again. with an interval, a background thread polls the
+       folder and reloads on changes.
+    """
+
+    daemon_threads = True
+
+    matrix = None
+
+
+    def __init__(self, watcher, address, interval=None):
+        """serve the folder of a started AddonWatcher on address (host, port)"""
+        super().__init__ ( address, QueryHandler )
+        self.watcher = watcher
+        self.matrix = self.prepare ( watcher.matrix )
+        self.generation = 0
+        self.reload_lock = threading.Lock()
+        self.interval = interval
+        self.stopping = threading.Event()
+
+
+    def __repr__(self):
+        return f"AddonServer ({self.server_address [0]}:{self.server_address [1]}, generation {self.generation})"
+
+
+
+    @staticmethod
+    def prepare ( matrix ):
+        """compute the lazily built parts of a matrix before readers see it"""
+        if matrix.version_edges is None:
+            matrix.build_version_edges()
+        return matrix
+
+
+    def reload ( self ):
+        """parse changed description files and swap in a new matrix.
+           returns the number of changed files, 0 if nothing changed.
+        """
+        with self.reload_lock:
+            changes = self.watcher.poll()
+            if not changes:
+                return 0
+            for description_file, exists in changes.items():
+                if exists:
+                    self.watcher.read ( description_file )
+                else:
+                    self.watcher.forget ( description_file )
+            matrix = DependencyMatrix ( self.watcher.installed() )
+            # the watcher's matrix is only read here, the served one is never modified
+            self.watcher.matrix = self.matrix = self.prepare ( matrix )
+            self.generation += 1
+            STATS.count ( "server reloads" )
+            LOGGER.info ( "reloaded %d changed files, generation %d", len ( changes ), self.generation )
+            return len ( changes )
+
+
+    def poll_forever ( self ):
+        """reload whenever the folder changed, until the server is closed"""
+        while not self.stopping.wait ( self.interval ):
+            try:
+                self.reload()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception ( "reload failed" )
+
+
+    def serve ( self ):
+        """serve requests until interrupted, polling in the background if enabled"""
+        if self.interval:
+            threading.Thread ( target=self.poll_forever, daemon=True ).start()
+        try:
+            self.serve_forever()
+        finally:
+            self.stopping.set()
+            self.server_close()
+
+
+
+    #  .d88b.  db    db d88888b d8888b. db    db
+    # .8P  Y8. 88    88 88'     88  `8D `8b  d8'
+    # 88    88 88    88 88ooooo 88oobY'  `8bd8'
+    # 88    88 88    88 88~~~~~ 88`8b      88
+    # `8P  d8' 88b  d88 88.     88 `88.    88
+    #  `Y88'Y8 ~Y8888P' Y88888P 88   YD    YP
+
+
+    def query ( self, path, parameters ):
+        """answer a query on the current matrix, return a json compatible value.
+           raises KeyError for unknown addons, LookupError for unknown paths
+           and ValueError for missing parameters.
+        """
+        matrix = self.matrix
+        name = parameters.get ( "name" )
+        if path == "/reload":
+            return { "changed": self.reload(), "generation": self.generation }
+        if path == "/status":
+            return {
+                "generation": self.generation,
+                "addons": len ( matrix.addons ),
+                "errors": len ( self.watcher.errors )
+            }
+        if path == "/unused":
+            return matrix.find_unused_libraries()
+        if path == "/order":
+            return matrix.compute_load_order()
+        if path == "/versions":
+            return matrix.check_version_constraints()
+        if path in ( "/deps", "/dependents", "/missing" ) and name is None:
+            raise ValueError ( "parameter name is missing" )
+        if path == "/deps":
+            return {
+                dependency_type: [ dep.to_dict() for dep in dependencies ]
+                for dependency_type, dependencies in matrix.get_dependencies ( name ).items()
+            }
+        if path == "/dependents":
+            transitive = parameters.get ( "transitive", "1" ) not in ( "0", "false", "no" )
+            return self.sorted_names ( matrix.get_dependents ( name, transitive ) )
+        if path == "/missing":
+            return self.sorted_names ( matrix.get_missing ( name ) )
+        raise LookupError ( path )
+
+
+    @staticmethod
+    def sorted_names ( entry ):
+        """turn a dict of name sets into a dict of sorted lists"""
+        return {
+            dependency_type: sorted ( names, key=str.casefold )
+            for dependency_type, names in entry.items()
+        }
+
+
+
+class QueryHandler ( BaseHTTPRequestHandler ):
+    """answers a single http request of an AddonServer with json"""
+
+    def do_GET ( self ):  # pylint: disable=invalid-name
+        """answer a query"""
+        url = urlsplit ( self.path )
+        parameters = { key: values [-1] for key, values in parse_qs ( url.query ).items() }
+        try:
+            self.respond ( 200, self.server.query ( url.path, parameters ) )
+        except KeyError as error:
+            self.respond ( 404, { "error": f"unknown addon: {error.args [0]}" } )
+        except LookupError:
+            self.respond ( 404, { "error": f"unknown query: {url.path}" } )
+        except ValueError as error:
+            self.respond ( 400, { "error": str ( error ) } )
+
+    do_POST = do_GET
+
+
+    def respond ( self, status, value ):
+        """send value as json"""
+        body = json.dumps ( value ).encode ( "utf-8" )
+        self.send_response ( status )
+        self.send_header ( "Content-Type", "application/json" )
+        self.send_header ( "Content-Length", str ( len ( body ) ) )
+        self.end_headers()
+        self.wfile.write ( body )
+
+
+    def log_message ( self, format, *args ):  # pylint: disable=redefined-builtin
+        """route the access log through logging"""
+        STATS.trace ( "server: " + format, *args )
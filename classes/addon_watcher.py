@@ -0,0 +1,210 @@
+"""provides a polling watcher keeping a dependency matrix up to date"""
+
+import time
+from os import stat
+from pathlib import Path
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.addon import select_installed_copies
+from classes.dependency_matrix import DependencyMatrix
+from classes.instrumentation import LOGGER, STATS
+# pylint: enable=import-error
+
+
+class AddonWatcher:
+    """watches the description files of an addon folder by polling.
+       the parsed addons and the matrix stay in memory. changed files are
+       collected until the folder was quiet for settle seconds, so a batch
+       of updates from an addon manager is applied at once. only changed
+       description files are parsed again and only the addons depending
+       on them are recomputed. of several copies of an addon, the one
+       select_installed_copies picks is in the matrix.
+       scan returns the description files of the folder, parse turns one
+       file into a tuple (addon, error).
+    """
+
+    # seconds between two polls
+    INTERVAL = 1.0
+    # seconds without changes before a batch is applied
+    SETTLE = 2.0
+
+    matrix = None
+
+
+    def __init__(self, scan, parse, interval=INTERVAL, settle=SETTLE):
+        """prepare a watcher, call start to read the folder"""
+        self.scan = scan
+        self.parse = parse
+        self.interval = interval
+        self.settle = settle
+        self.files = {}         # path -> (mtime_ns, size)
+        self.addons = {}        # path -> Addon
+        self.errors = {}        # path -> message
+
+
+    def __repr__(self):
+        return f"AddonWatcher ({len ( self.files )} files, {len ( self.errors )} errors)"
+
+
+
+    # .d8888. d888888b  .d8b.  d888888b d88888b
+    # 88'  YP `~~88~~' d8' `8b `~~88~~' 88'
+    # `8bo.      88    88ooo88    88    88ooooo
+    #   `Y8b.    88    88~~~88    88    88~~~~~
+    # db   8D    88    88   88    88    88.
+    # `8888Y'    YP    YP   YP    YP    Y88888P
+
+
+    def snapshot ( self ):
+        """return (mtime_ns, size) of every description file found by scan"""
+        files = {}
+        for description_file in self.scan():
+            try:
+                file_stat = stat ( description_file )
+            except OSError:
+                continue
+            files [ description_file ] = ( file_stat.st_mtime_ns, file_stat.st_size )
+        return files
+
+
+    def start ( self, addon_info=None ):
+        """read the folder and build the matrix.
+           addons already parsed can be passed in addon_info (name -> addon),
+           only files without an entry parsed from that very file are parsed.
+        """
+        addon_info = addon_info or {}
+        self.files = self.snapshot()
+        for description_file in self.files:
+            addon = addon_info.get ( Path ( description_file ).stem )
+            if addon is None or addon.get_description_file() != description_file:
+                # other copies of an addon in addon_info lost against this one
+                self.read ( description_file )
+            else:
+                self.addons [ description_file ] = addon
+        self.matrix = DependencyMatrix ( self.installed() )
+        return self.matrix
+
+
+    def installed ( self ):
+        """return the copies of the read addons counting as installed, name -> addon"""
+        return select_installed_copies ( self.addons.values() )
+
+
+    def read ( self, description_file ):
+        """parse one description file, return the addon or None"""
+        addon, error = self.parse ( description_file )
+        if addon is None:
+            LOGGER.warning ( "could not read %s: %s", description_file, error )
+            self.errors [ description_file ] = error
+            self.addons.pop ( description_file, None )
+        else:
+            self.errors.pop ( description_file, None )
+            self.addons [ description_file ] = addon
+        return addon
+
+
+    def forget ( self, description_file ):
+        """drop a removed description file"""
+        self.addons.pop ( description_file, None )
+        self.errors.pop ( description_file, None )
+
+
+
+    # .o88b. db   db  .d8b.  d8b   db  d888b  d88888b .d8888.
+    # d8P  Y8 88   88 d8' `8b 888o  88 88' Y8b 88'     88'  YP
+    # 8P      88ooo88 88ooo88 88V8o 88 88      88ooooo `8bo.
+    # 8b      88~~~88 88~~~88 88 V8o88 88  ooo 88~~~~~   `Y8b.
+    # Y8b  d8 88   88 88   88 88  V888 88. ~8~ 88.     db   8D
+    #  `Y88P' YP   YP YP   YP VP   V8P  Y888P  Y88888P `8888Y'
+
+
+    def poll ( self ):
+        """compare the folder with the last poll.
+           returns the changed paths, mapped to True if the file exists
+           and to False if it was removed.
+        """
+        files = self.snapshot()
+        changes = {
+            description_file: True for description_file, signature in files.items()
+            if self.files.get ( description_file ) != signature
+        }
+        changes.update (
+            ( description_file, False ) for description_file in self.files
+            if description_file not in files
+        )
+        self.files = files
+        return changes
+
+
+    def wait_for_changes ( self ):
+        """poll until something changed and the folder was quiet for settle
+           seconds, then return all changes seen meanwhile as one batch
+        """
+        batch = {}
+        quiet_since = None
+        while True:
+            changes = self.poll()
+            now = time.monotonic()
+            if changes:
+                batch.update ( changes )
+                quiet_since = now
+            elif batch and now - quiet_since >= self.settle:
+                STATS.count ( "watch batches" )
+                STATS.count ( "watch changes", len ( batch ) )
+                return batch
+            time.sleep ( self.interval )
+
+
+    def apply ( self, batch ):
+        """parse the changed files of a batch and update the matrix.
+           returns (affected, removed): the ids whose results were recomputed
+           and the names of addons no longer installed.
+        """
+        affected = set()
+        removed = set()
+        changed = {}
+        for description_file, exists in batch.items():
+            previous = self.addons.get ( description_file )
+            addon = None
+            if exists:
+                addon = self.read ( description_file )
+                STATS.trace ( "watch: reparsed %s", description_file )
+            else:
+                self.forget ( description_file )
+            for copy in ( previous, addon ):
+                if copy is not None:
+                    changed [ copy.get_addon_id() ] = copy.get_name()
+
+        # a changed file may add, replace or remove the copy in the matrix
+        for addon_id, name in changed.items():
+            current = self.matrix.addons.get ( addon_id )
+            chosen = self.find_copy ( name )
+            if chosen is None:
+                if current is not None:
+                    affected.update ( self.matrix.remove_addon ( current.get_name() ) )
+                    removed.add ( current.get_name() )
+            elif chosen is not current:
+                affected.update ( self.matrix.add_addon ( chosen ) )
+        removed.difference_update ( self.matrix.addon_list )
+        return affected, removed
+
+
+    def find_copy ( self, addon_name ):
+        """return the installed copy of an addon, e.g. of a bundled library,
+           None if no copy is left
+        """
+        key = addon_name.casefold()
+        copies = select_installed_copies (
+            addon for addon in self.addons.values() if addon.get_name().casefold() == key
+        )
+        return next ( iter ( copies.values() ), None )
+
+
+    def watch ( self ):
+        """apply batches of changes forever, yielding (affected, removed)"""
+        while True:
+            batch = self.wait_for_changes()
+            affected, removed = self.apply ( batch )
+            if affected or removed:
+                yield affected, removed
@@ -1,15 +1,40 @@
 """Provide a class to store and process one dependency"""
 
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.name_table import NAMES
+# pylint: enable=import-error
+
+
+
+def parse_version_key ( value ):
+    """turn a version string into an integer sort key.
+       ESO versions (AddOnVersion and the numbers in DependsOn) are plain
+       integers, anything else cannot be compared and returns None.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int ( value )
+    return None
+
 class Dependency:
     """Process and store a single dependency"""
 
     DEPENDENCY_MANDAOTRY    = 0
     DEPENDENCY_OPTIONAL     = 1
 
-    name = ""
-    min_version = None
-    max_version = None
-    dependency_type = DEPENDENCY_MANDAOTRY
+    __slots__ = (
+        "name",             # name as written in the description file
+        "key",              # casefolded name used for sorting
+        "target_id",        # interned id of the name used for lookups
+        "min_version",
+        "min_key",          # min_version as integer, None if not comparable
+        "max_version",
+        "max_key",          # max_version as integer, None if not comparable
+        "dependency_type"
+    )
 
 
 
@@ -30,11 +55,49 @@ class Dependency:
 
 
 
+    def to_dict(self):
+        """return the dependency as a dict of plain values"""
+        return {
+            "name": self.name,
+            "min_version": self.min_version,
+            "max_version": self.max_version,
+            "dependency_type": self.dependency_type
+        }
+
+
+    def __getstate__(self):
+        # ids are only valid within one process, pickle names instead
+        return self.to_dict()
+
+
+    def __setstate__(self, state):
+        self.set_fields ( state )
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """create a dependency from a dict returned by to_dict"""
+        result = cls.__new__ ( cls )
+        result.set_fields ( data )
+        return result
+
+
+    def set_fields(self, data):
+        """set all fields from a dict returned by to_dict"""
+        self.set_name ( data["name"] )
+        self.set_min_version ( data["min_version"] )
+        self.set_max_version ( data["max_version"] )
+        self.dependency_type = data["dependency_type"]
+
+
+
     def clear(self):
         """clear instance fields"""
         self.name = ""
-        self.min_version = None
-        self.max_version = None
+        self.key = ""
+        self.target_id = None
+        self.set_min_version ( None )
+        self.set_max_version ( None )
         self.dependency_type = Dependency.DEPENDENCY_MANDAOTRY
 
 
@@ -43,16 +106,17 @@ class Dependency:
         """Interpret a  list of dependencies including version information and return a dict."""
         # defaults
         self.clear()
-        self.name = dependency_string
+        name = dependency_string
         # version information given
         if ">=" in dependency_string:
             data = dependency_string.split(">=")
-            self.name = data[0]
-            self.min_version = data[1]
+            name = data[0]
+            self.set_min_version ( data[1] )
         if "<=" in dependency_string:
             data = dependency_string.split("<=")
-            self.name = data[0]
-            self.max_version = data[1]
+            name = data[0]
+            self.set_max_version ( data[1] )
+        self.set_name ( name )
 
 
 
@@ -69,57 +133,58 @@ class Dependency:
         """merges the version information of two dependenies
            - name must match
            - type must match
-           checks for contradictions and returns None on conflict
+           both constraints must hold, so the merged interval is the
+           intersection: keep the higher min version, keep the lower max version.
+           checks for contradictions and returns None on conflict,
+           leaving this dependency untouched.
         """
-        if self.name != other.get_name():
+        if self.target_id != other.target_id:
             raise ValueError ( "dependency names don't match" )
         if self.dependency_type != other.dependency_type:
             raise ValueError ( "dependency types don't match" )
 
-        rmin = None
-        if self.min_version is not None:
-            if other.min_version is not None:
-                # cannot use min, this might be strings
-                if self.min_version <= other.min_version:
-                    rmin = self.min_version
-                else:
-                    rmin = other.min_version
-            else:
-                # other min_version is None, use own
-                rmin = self.min_version
-        else:
-            if other.min_version is not None:
-                # own min_version is None, use other
-                rmin = other.min_version
+        # versions are compared by their integer keys, a version that
+        # cannot be compared is only kept if there is no other one
+        rmin, rmin_key = self.min_version, self.min_key
+        if other.min_key is not None:
+            if rmin_key is None or other.min_key > rmin_key:
+                rmin, rmin_key = other.min_version, other.min_key
+        elif rmin is None:
+            rmin = other.min_version
 
         # same for max version
-        rmax = None
-        if self.max_version is not None:
-            if other.max_version is not None:
-                # cannot use max, this might be strings
-                if self.max_version >= other.max_version:
-                    rmax = self.max_version
-                else:
-                    rmax = other.max_version
-            else:
-                # other min_version is None, use own
-                rmax = self.max_version
-        else:
-            if other.min_version is not None:
-                # own min_version is None, use other
-                rmax = other.max_version
+        rmax, rmax_key = self.max_version, self.max_key
+        if other.max_key is not None:
+            if rmax_key is None or other.max_key < rmax_key:
+                rmax, rmax_key = other.max_version, other.max_key
+        elif rmax is None:
+            rmax = other.max_version
 
         #check for contraditions:
-        if rmin is not None and rmax is not None:
-            if rmin > rmax:
+        if rmin_key is not None and rmax_key is not None:
+            if rmin_key > rmax_key:
                 return None
 
         # update own version info and return object
-        self.min_version = rmin
-        self.max_version = rmax
+        self.min_version, self.min_key = rmin, rmin_key
+        self.max_version, self.max_key = rmax, rmax_key
         return self
 
 
+    def copy ( self ):
+        """return an independent copy, so merging does not touch addon data"""
+        result = Dependency.__new__ ( Dependency )
+        result.name = self.name
+        result.key = self.key
+        result.target_id = self.target_id
+        result.min_version = self.min_version
+        result.min_key = self.min_key
+        result.max_version = self.max_version
+        result.max_key = self.max_key
+        result.dependency_type = self.dependency_type
+        return result
+
+
 
     #  d888b  d88888b d888888b           dD      .d8888. d88888b d888888b
     # 88' Y8b 88'     `~~88~~'          d8'      88'  YP 88'     `~~88~~'
@@ -134,8 +199,33 @@ class Dependency:
         """return this dependency's name"""
         return self.name
     def set_name(self, value):
-        """set this dependency's name"""
+        """set this dependency's name, interning it"""
         self.name = value
+        self.target_id = NAMES.intern ( value )
+        self.key = NAMES.get_key ( self.target_id )
+
+    def get_target_id(self):
+        """return the interned id of this dependency's name"""
+        return self.target_id
+
+    def set_min_version(self, value):
+        """set the minimum version and its integer key"""
+        self.min_version = value
+        self.min_key = parse_version_key ( value )
+    def set_max_version(self, value):
+        """set the maximum version and its integer key"""
+        self.max_version = value
+        self.max_key = parse_version_key ( value )
+
+    def is_satisfied_by ( self, version_key ):
+        """check an installed version key against this dependency's constraints.
+           constraints that cannot be compared are not checked.
+        """
+        if self.min_key is not None and ( version_key is None or version_key < self.min_key ):
+            return False
+        if self.max_key is not None and version_key is not None and version_key > self.max_key:
+            return False
+        return True
 
     def is_mandatory ( self ):
         """returns whether a dependency is mandatory"""
@@ -151,12 +241,13 @@ class Dependency:
     # `8888Y'  `Y88P'  88   YD    YP    Y888888P VP   V8P  Y888P
 
     def __eq__(self, other):
-        return ((self.name.lower()) ==
-                (other.get_name().lower()))
+        return self.target_id == other.target_id
 
     def __lt__(self, other):
-        return ((self.name.lower() ) <
-                (other.get_name().lower()))
+        return self.key < other.key
+
+    def __hash__(self):
+        return self.target_id
 
 
 
@@ -1,9 +1,14 @@
 """provides a dependency matrix class"""
 
+from array import array
+from bisect import bisect_left, bisect_right
+
 # pamper pylint stupidity
 # pylint: disable=import-error
-# from classes.addon import Addon
-# from classes.dependency import Dependency
+from classes.dependency import Dependency
+from classes.instrumentation import STATS
+from classes.matrix_snapshot import MatrixSnapshot
+from classes.name_table import NAMES
 # pylint: enable=import-error
 
 class DependencyMatrix:
@@ -13,14 +18,18 @@ class DependencyMatrix:
 
     SCAN_DEPTH = 10
 
-    matrix = []
+    # bounds used in the version edge arrays for "no constraint"
+    NO_MIN_VERSION = -1
+    NO_MAX_VERSION = 2 ** 62
+
+    matrix = None
     addon_list = None
 
 
     def __init__(self, addon_list):
         """initialize matrix with list of addons"""
-        self.addon_list = addon_list
-        self.build_matrix ( self.SCAN_DEPTH )
+        self.reset ( addon_list )
+        self.build_matrix ()
 
 
 
@@ -28,101 +37,1281 @@ class DependencyMatrix:
         return "DependencyMatrix"
 
 
-    def recursive_gathering ( self, addon_name, depth ):
-        """recursive addon scanner.
-           checks dependencies of dependencies
-           reduces depth by one on every call, breaks if depth==0
+
+    def reset ( self, addon_list ):
+        """set the addon list and forget everything computed"""
+        self.addon_list = addon_list
+        self.addons = {}
+        self.edges = {}
+        self.direct_dependents = {}
+        self.transitive_dependents = {}
+        self.version_edges = None
+        self.adjacency = None
+        self.mandatory_reach = {}
+        self.full_reach = {}
+        self.closure = {}
+        self.matrix = {}
+        # reduced dependencies loaded from a snapshot, decoded on first use
+        self.snapshot_reduced = {}
+        # installed addons loaded from a snapshot whose closure is derived on first use
+        self.snapshot_closure = set()
+        self.conflicts = {}
+
+
+
+    #  .o88b. db       .d88b.  .d8888. db    db d8888b. d88888b
+    # d8P  Y8 88      .8P  Y8. 88'  YP 88    88 88  `8D 88'
+    # 8P      88      88    88 `8bo.   88    88 88oobY' 88ooooo
+    # 8b      88      88    88   `Y8b. 88    88 88`8b   88~~~~~
+    # Y8b  d8 88booo. `8b  d8' db   8D 88b  d88 88 `88. 88.
+    #  `Y88P' Y88888P  `Y88P'  `8888Y' ~Y8888P' 88   YD Y88888P
+
+
+    def build_edges ( self ):
+        """index installed addons by id and build their edges"""
+        self.addons = {}
+        self.edges = {}
+        for addon in self.addon_list.values():
+            self.index_addon ( addon )
+
+
+    def index_addon ( self, addon ):
+        """store the ids of an addon's direct dependencies as
+           (mandatory, optional) tuples
         """
+        addon_id = addon.get_addon_id()
+        self.addons [ addon_id ] = addon
+        self.version_edges = None
+        self.adjacency = None
+        mandatory = tuple ( addon.get_depends_on_ids() )
+        optional = tuple ( addon.get_optional_depends_on_ids() )
+        self.edges [ addon_id ] = ( mandatory, optional )
+        STATS.count ( "edges", len ( mandatory ) + len ( optional ) )
+
+
+    def unindex_addon ( self, addon_id ):
+        """remove an addon from the id index and its edges"""
+        del self.addons [ addon_id ]
+        self.version_edges = None
+        self.adjacency = None
+        del self.edges [ addon_id ]
 
-        # Gather all dependencies from current addon
-        # regardless of mandatory or optional.
-        # dependencies carry a mandatory flag to determine type later.
 
-        # at this point in the recursion, the addon_name is valid.
+    def mandatory_successors ( self, addon_id ):
+        """direct mandatory dependencies of an addon, empty if not installed"""
+        if addon_id in self.edges:
+            return self.edges [ addon_id ][0]
+        return ()
+
+
+    def all_successors ( self, addon_id ):
+        """direct mandatory and optional dependencies of an addon"""
+        if addon_id in self.edges:
+            mandatory, optional = self.edges [ addon_id ]
+            return mandatory + optional
+        return ()
+
+
+    @staticmethod
+    def compute_reachability ( roots, successors, reach ):
+        """fill reach[node] for every node reachable from roots.
+           iterative tarjan: every strongly connected component is solved
+           once and all its members share the resulting frozenset, so each
+           node and edge is visited once, no matter how many paths lead to it.
+           nodes already present in reach are treated as solved.
+           a node is only part of its own set if it sits on a cycle.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        counter = 0
+
+        for root in roots:
+            if root in reach or root in index:
+                continue
+            STATS.trace ( "closure: scanning from %s", NAMES.get_name ( root ) )
+            index [ root ] = lowlink [ root ] = counter
+            counter += 1
+            stack.append ( root )
+            on_stack.add ( root )
+            work = [ ( root, iter ( successors ( root ) ) ) ]
+
+            while work:
+                node, children = work [-1]
+                descended = False
+                for child in children:
+                    if child in reach:
+                        continue
+                    if child not in index:
+                        index [ child ] = lowlink [ child ] = counter
+                        counter += 1
+                        stack.append ( child )
+                        on_stack.add ( child )
+                        work.append ( ( child, iter ( successors ( child ) ) ) )
+                        descended = True
+                        break
+                    if child in on_stack:
+                        lowlink [ node ] = min ( lowlink [ node ], index [ child ] )
+                if descended:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work [-1][0]
+                    lowlink [ parent ] = min ( lowlink [ parent ], lowlink [ node ] )
+
+                if lowlink [ node ] == index [ node ]:
+                    # node is the root of a component, pop all members
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard ( member )
+                        component.append ( member )
+                        if member == node:
+                            break
+                    members = set ( component )
+                    result = set()
+                    for member in component:
+                        for child in successors ( member ):
+                            result.add ( child )
+                            if child not in members:
+                                result.update ( reach [ child ] )
+                    result = frozenset ( result )
+                    for member in component:
+                        reach [ member ] = result
+        STATS.count ( "closure nodes", counter )
+        return reach
+
+
+    def compute_closure ( self, roots ):
+        """compute mandatory and optional transitive dependencies for roots.
+           mandatory: reachable using mandatory edges only.
+           optional: reachable at all, but only through an optional edge,
+           so mandatory dependencies of optional dependencies stay optional.
+        """
+        with STATS.phase ( "closure" ):
+            self.compute_reachability ( roots, self.mandatory_successors, self.mandatory_reach )
+            self.compute_reachability ( roots, self.all_successors, self.full_reach )
+            self.store_closure ( roots )
+
+
+    def store_closure ( self, roots ):
+        """derive mandatory and optional closure of roots from reachability"""
+        for addon_id in roots:
+            mandatory = self.mandatory_reach [ addon_id ] - { addon_id }
+            optional = self.full_reach [ addon_id ] - mandatory - { addon_id }
+            self.closure [ addon_id ] = {
+                'mandatory': mandatory,
+                'optional':  optional
+            }
+
+
+    def get_closure_entry ( self, addon_id ):
+        """return the closure of an addon, deriving it from reachability first
+           if the matrix was loaded from a snapshot
+        """
+        if addon_id in self.snapshot_closure:
+            self.snapshot_closure.discard ( addon_id )
+            self.store_closure ( [ addon_id ] )
+        return self.closure [ addon_id ]
+
+
+
+    def build_adjacency ( self ):
+        """build the bit packed adjacency matrices of the install.
+           installed addons and the targets of their dependencies get dense
+           indices, so rows are sized to this install and not to every name
+           ever interned. row i of a matrix is an int with bit j set if node
+           i directly depends on node j: one matrix for mandatory edges, one
+           for mandatory and optional edges. cached until an addon changes.
+        """
+        ids = list ( self.addons )
+        index = { addon_id: position for position, addon_id in enumerate ( ids ) }
+        for mandatory, optional in self.edges.values():
+            for name_id in mandatory + optional:
+                if name_id not in index:
+                    index [ name_id ] = len ( ids )
+                    ids.append ( name_id )
+
+        mandatory_rows = [ 0 ] * len ( ids )
+        all_rows = [ 0 ] * len ( ids )
+        for addon_id, ( mandatory, optional ) in self.edges.items():
+            row = 0
+            for name_id in mandatory:
+                row |= 1 << index [ name_id ]
+            mandatory_rows [ index [ addon_id ] ] = row
+            for name_id in optional:
+                row |= 1 << index [ name_id ]
+            all_rows [ index [ addon_id ] ] = row
+        self.adjacency = {
+            'ids': ids,
+            'index': index,
+            'mandatory': mandatory_rows,
+            'all': all_rows
+        }
+        return self.adjacency
+
+
+    @staticmethod
+    def propagate_depths ( sources, rows, max_depth ):
+        """breadth first search from every source over bit packed rows.
+           the frontier is a bit set, the next one is the boolean product
+           frontier x adjacency: the OR of the rows of all frontier nodes,
+           minus the nodes seen before. returns one list per source with
+           the bit set of nodes first reached at each depth, depth 1 first.
+        """
+        result = []
+        for source in sources:
+            seen = frontier = 1 << source
+            levels = []
+            for _ in range ( max_depth ):
+                reached = 0
+                while frontier:
+                    low = frontier & -frontier
+                    frontier ^= low
+                    reached |= rows [ low.bit_length() - 1 ]
+                frontier = reached & ~seen
+                if not frontier:
+                    break
+                seen |= frontier
+                levels.append ( frontier )
+            result.append ( levels )
+        return result
+
+
+    def query_depths ( self, addon_names, max_depth=None ):
+        """answer which transitive dependencies each of the given addons
+           has and at which depth they first appear, in one batched call.
+           returns a dict addon name -> {'mandatory': {name: depth},
+           'optional': {name: depth}}. optional entries are reached only
+           through an optional edge, their depth counts all edges.
+        """
+        if max_depth is None:
+            max_depth = self.SCAN_DEPTH
+        adjacency = self.adjacency
+        if adjacency is None:
+            adjacency = self.build_adjacency()
+        names = [ NAMES.get_name ( name_id ) for name_id in adjacency['ids'] ]
+        sources = [
+            adjacency['index'] [ self.lookup_id ( addon_name ) ] for addon_name in addon_names
+        ]
+
+        result = [ { 'mandatory': {}, 'optional': {} } for _ in sources ]
+        for dependency_type, rows in ( ( 'mandatory', adjacency['mandatory'] ),
+                                       ( 'optional', adjacency['all'] ) ):
+            for entry, levels in zip ( result, self.propagate_depths ( sources, rows, max_depth ) ):
+                for depth, bits in enumerate ( levels, 1 ):
+                    while bits:
+                        low = bits & -bits
+                        bits ^= low
+                        name = names [ low.bit_length() - 1 ]
+                        if name not in entry['mandatory']:
+                            entry [ dependency_type ][ name ] = depth
+
+        return {
+            addon_name: result [ position ] for position, addon_name in enumerate ( addon_names )
+        }
+
+
+
+    #  d888b   .d8b.  d888888b db   db d88888b d8888b.
+    # 88' Y8b d8' `8b `~~88~~' 88   88 88'     88  `8D
+    # 88      88ooo88    88    88ooo88 88ooooo 88oobY'
+    # 88  ooo 88~~~88    88    88~~~88 88~~~~~ 88`8b
+    # 88. ~8~ 88   88    88    88   88 88.     88 `88.
+    #  Y888P  YP   YP    YP    YP   YP Y88888P 88   YD
+
+
+    def gather_dependencies ( self, addon_id ):
+        """collect every dependency entry relevant for an addon's closure,
+           including version information, split into mandatory and optional
+        """
+        closure = self.get_closure_entry ( addon_id )
         dependencies = {
-            'mandatory': self.addon_list[addon_name].get_depends_on(),
-            'optional':  self.addon_list[addon_name].get_optional_depends_on()
+            'mandatory': [],
+            'optional':  []
         }
 
-        # check if maximum depth is reached
-        print ( f"DEPTH: {depth}   Addon: {addon_name}" )
-        if 0 >= depth:
-            print ( "scan depth reached." )
-            return dependencies
+        for name_id in closure['mandatory'] | { addon_id }:
+            if name_id in self.addons:
+                for dep in self.addons [ name_id ].get_depends_on():
+                    # skip edges leading back to the addon itself (cycles)
+                    if dep.get_target_id() in closure['mandatory']:
+                        dependencies['mandatory'].append ( dep )
 
-        if 0 == len ( dependencies['mandatory'] ):
-            print ( "no further mandatory dependencies." )
-        else:
-            for dependency in dependencies['mandatory']:
-                # check if current addon exists.
-                # id not, just return an empty list.
-                # missing dependencies are checked for later.
-                addon_name = dependency.get_name()
-                if addon_name in self.addon_list:
-                    result = self.recursive_gathering ( addon_name, depth - 1)
-                    dependencies['mandatory'].extend(result['mandatory'])
-                    dependencies['optional'].extend(result['optional'])
-
-        if 0 == len ( dependencies['optional'] ):
-            print ( "no further optional dependencies." )
-        else:
-            for dependency in dependencies['optional']:
-                # check if current addon exists.
-                # id not, just return an empty list.
-                # missing dependencies are checked for later.
-                addon_name = dependency.get_name()
-                if addon_name in self.addon_list:
-                    result = self.recursive_gathering ( addon_name, depth - 1)
-                    # important: we are recursing checking optional dependencies here
-                    # so any mandatory dependency returned must still be listed optional
-                    dependencies['optional'].extend(result['mandatory'])
-                    dependencies['optional'].extend(result['optional'])
+        if closure['optional']:
+            for name_id in self.full_reach [ addon_id ] | { addon_id }:
+                if name_id in self.addons:
+                    for dep in self.addons [ name_id ].get_combined_dependencies():
+                        if dep.get_target_id() in closure['optional']:
+                            dependencies['optional'].append ( dep )
 
         return dependencies
 
 
-    def reduce_dependencies ( self, gathered_list ):
-        """reduces gathered list of dependencies
-           using the dependency_weight method to sort out dublicates
+    @staticmethod
+    def reduce_dependencies ( gathered_list ):
+        """reduces gathered list of dependencies in a single pass.
+           entries are indexed by their normalized name, version constraints
+           of duplicates are merged as intervals on a copy of the first entry.
+           returns a dict with the reduced 'dependencies' and a list of
+           'conflicts', one dict per constraint that could not be merged.
         """
-        dependencies = []
+        reduced = {}
+        conflicts = []
         for dep in gathered_list:
-            # check whether already present
-            if dep in dependencies:
-                index = dependencies.index( dep )
-                # check version information for
-                # higher demand or conflicts
-                merged = dependencies [ index ].merge_version_information ( dep )
-                if merged is None:
-                    print ("PROBLEM!")
-                    raise ValueError ("SNAFU!")
-                gathered_list [ index ] = merged
-            else:
-                # else: add
-                dependencies.append ( dep )
-        return dependencies
+            merged = reduced.get ( dep.target_id )
+            if merged is None:
+                reduced [ dep.target_id ] = dep.copy()
+            elif merged.merge_version_information ( dep ) is None:
+                conflicts.append ( {
+                    'name':        merged.get_name(),
+                    'min_version': merged.min_version,
+                    'max_version': merged.max_version,
+                    'conflicting': dep
+                } )
+        return {
+            'dependencies': sorted ( reduced.values() ),
+            'conflicts':    conflicts
+        }
+
 
 
+    def reduce_addon ( self, addon_id ):
+        """gather and reduce the dependencies of one addon into the matrix"""
+        with STATS.phase ( "reduce" ):
+            gathered = self.gather_dependencies ( addon_id )
+            dependencies = {}
+            conflicts = {}
+            for dependency_type in ( 'mandatory', 'optional' ):
+                STATS.count ( "gathered edges", len ( gathered [ dependency_type ] ) )
+                reduced = self.reduce_dependencies ( gathered [ dependency_type ] )
+                dependencies [ dependency_type ] = reduced['dependencies']
+                conflicts [ dependency_type ] = reduced['conflicts']
+        self.matrix [ addon_id ] = dependencies
+        name = self.addons [ addon_id ].get_name()
+        if conflicts['mandatory'] or conflicts['optional']:
+            self.conflicts [ name ] = conflicts
+        else:
+            self.conflicts.pop ( name, None )
 
-    def build_matrix ( self, scan_depth ):
+
+
+    def build_matrix ( self ):
         """builds the dependency matrix based on the list of addons"""
-        print ( "Building Matrix." )
-        # for addon_name in self.addon_list.keys():
-        #     print ( addon_name )
-        #     dependencies = self.recursive_gathering ( addon_name, scan_depth )
-        dependencies = self.recursive_gathering ( "AAQ", scan_depth )
-
-        print ( "Mandatory found:" )
-        dependencies['mandatory'].sort()
-        print ( repr ( dependencies['mandatory'] ) )
-        dependencies['mandatory'] = self.reduce_dependencies ( dependencies['mandatory'] )
-        print ( "Mandatory reduced to:" )
-        print ( repr ( dependencies['mandatory'] ) )
-
-
-        print ( "Optional found:" )
-        dependencies['optional'].sort()
-        print ( repr ( dependencies['optional'] ) )
-        dependencies['optional'] = self.reduce_dependencies ( dependencies['optional'] )
-        print ( "Optional reduced to:" )
-        print ( repr ( dependencies['optional'] ) )
+        self.build_edges ()
+        self.direct_dependents = {}
+        self.transitive_dependents = {}
+        self.conflicts = {}
+        for addon_id in self.addons:
+            self.index_direct_dependents ( addon_id )
+        self.update_closure ( list ( self.addons ) )
+
+
+    def update_closure ( self, roots ):
+        """compute closure, reverse index entries and reduced dependencies"""
+        self.compute_closure ( roots )
+        for addon_id in roots:
+            self.index_transitive_dependents ( addon_id )
+            self.reduce_addon ( addon_id )
+
+
+
+    # d8888b. d88888b db    db d88888b d8888b. .d8888. d88888b
+    # 88  `8D 88'     88    88 88'     88  `8D 88'  YP 88'
+    # 88oobY' 88ooooo Y8    8P 88ooooo 88oobY' `8bo.   88ooooo
+    # 88`8b   88~~~~~ `8b  d8' 88~~~~~ 88`8b     `Y8b. 88~~~~~
+    # 88 `88. 88.      `8bd8'  88.     88 `88. db   8D 88.
+    # 88   YD Y88888P    YP    Y88888P 88   YD `8888Y' Y88888P
+
+
+    def dependents_entry ( self, index, name_id ):
+        """return the reverse index entry of a name, creating it if needed"""
+        entry = index.get ( name_id )
+        if entry is None:
+            entry = index [ name_id ] = { 'mandatory': set(), 'optional': set() }
+        return entry
+
+
+    def index_direct_dependents ( self, addon_id, remove=False ):
+        """add (or remove) an addon's direct edges to the reverse index"""
+        mandatory, optional = self.edges [ addon_id ]
+        for dependency_type, targets in ( ( 'mandatory', mandatory ), ( 'optional', optional ) ):
+            for name_id in targets:
+                entry = self.dependents_entry ( self.direct_dependents, name_id )
+                if remove:
+                    entry [ dependency_type ].discard ( addon_id )
+                else:
+                    entry [ dependency_type ].add ( addon_id )
+
+
+    def index_transitive_dependents ( self, addon_id, remove=False ):
+        """add (or remove) an addon's closure to the reverse index"""
+        closure = self.get_closure_entry ( addon_id )
+        for dependency_type in ( 'mandatory', 'optional' ):
+            for name_id in closure [ dependency_type ]:
+                entry = self.dependents_entry ( self.transitive_dependents, name_id )
+                if remove:
+                    entry [ dependency_type ].discard ( addon_id )
+                else:
+                    entry [ dependency_type ].add ( addon_id )
+
+
+    def affected_by ( self, name_id ):
+        """return the ids whose closure may change if name_id changes:
+           the name itself and everything depending on it in any way
+        """
+        affected = { name_id }
+        entry = self.transitive_dependents.get ( name_id )
+        if entry is not None:
+            affected.update ( entry['mandatory'] )
+            affected.update ( entry['optional'] )
+        return affected
+
+
+    def invalidate ( self, affected ):
+        """drop all computed data of the affected ids.
+           everything reaching a changed addon is part of affected, so every
+           strongly connected component is either dropped or kept as a whole.
+        """
+        for addon_id in affected:
+            if addon_id in self.closure or addon_id in self.snapshot_closure:
+                self.index_transitive_dependents ( addon_id, remove=True )
+                del self.closure [ addon_id ]
+                self.matrix.pop ( addon_id, None )
+                self.snapshot_reduced.pop ( addon_id, None )
+            self.mandatory_reach.pop ( addon_id, None )
+            self.full_reach.pop ( addon_id, None )
+        for addon_id in affected:
+            if addon_id in self.addons:
+                self.conflicts.pop ( self.addons [ addon_id ].get_name(), None )
+
+
+    def add_addon ( self, addon ):
+        """add or replace a single addon, only recomputing what depends on it.
+           returns the set of ids whose results were recomputed.
+        """
+        addon_id = addon.get_addon_id()
+        affected = self.affected_by ( addon_id )
+        self.invalidate ( affected )
+        if addon_id in self.addons:
+            self.index_direct_dependents ( addon_id, remove=True )
+            del self.addon_list [ self.addons [ addon_id ].get_name() ]
+        self.addon_list [ addon.get_name() ] = addon
+        self.index_addon ( addon )
+        self.index_direct_dependents ( addon_id )
+        affected = [ name_id for name_id in affected if name_id in self.addons ]
+        self.update_closure ( affected )
+        return set ( affected )
+
+
+    def remove_addon ( self, addon_name ):
+        """remove a single addon, only recomputing what depends on it.
+           returns the set of ids whose results were recomputed.
+        """
+        addon_id = self.lookup_id ( addon_name )
+        affected = self.affected_by ( addon_id )
+        self.invalidate ( affected )
+        self.index_direct_dependents ( addon_id, remove=True )
+        del self.addon_list [ self.addons [ addon_id ].get_name() ]
+        self.unindex_addon ( addon_id )
+        affected = [ name_id for name_id in affected if name_id in self.addons ]
+        self.update_closure ( affected )
+        return set ( affected )
+
+
+
+    # db       .d88b.   .d8b.  d8888b.       .d88b.  d8888b. d8888b. d88888b d8888b.
+    # 88      .8P  Y8. d8' `8b 88  `8D      .8P  Y8. 88  `8D 88  `8D 88'     88  `8D
+    # 88      88    88 88ooo88 88   88      88    88 88oobY' 88   88 88ooooo 88oobY'
+    # 88      88    88 88~~~88 88   88      88    88 88`8b   88   88 88~~~~~ 88`8b
+    # 88booo. `8b  d8' 88   88 88  .8D      `8b  d8' 88 `88. 88  .8D 88.     88 `88.
+    # Y88888P  `Y88P'  YP   YP Y8888D'       `Y88P'  88   YD Y8888D' Y88888P 88   YD
+
+
+    def find_cycles ( self ):
+        """return the mandatory dependency cycles between installed addons.
+           members of a strongly connected component share one reach set,
+           so components are read from the closure memo without another scan.
+           every entry lists the members and one concrete cycle through them.
+        """
+        components = {}
+        for addon_id in self.addons:
+            reach = self.mandatory_reach [ addon_id ]
+            if addon_id in reach:
+                components.setdefault ( id ( reach ), [] ).append ( addon_id )
+
+        cycles = []
+        for members in components.values():
+            member_set = set ( members )
+            start = min ( members, key=NAMES.get_key )
+            # breadth first search from start back to start inside the component
+            parents = {}
+            queue = [ start ]
+            position = 0
+            while start not in parents:
+                node = queue [ position ]
+                position += 1
+                for child in self.mandatory_successors ( node ):
+                    if child in member_set and child not in parents:
+                        parents [ child ] = node
+                        queue.append ( child )
+            path = [ start ]
+            node = parents [ start ]
+            while node != start:
+                path.append ( node )
+                node = parents [ node ]
+            path.append ( start )
+            path.reverse()
+            cycles.append ( {
+                'members': sorted ( ( NAMES.get_name ( name_id ) for name_id in members ),
+                                    key=str.casefold ),
+                'cycle': [ NAMES.get_name ( name_id ) for name_id in path ]
+            } )
+        return cycles
+
+
+    def compute_load_order ( self ):
+        """compute an order in which every addon comes after its dependencies.
+           kahn's algorithm in waves: mandatory edges are hard constraints,
+           optional edges are soft ones. addons in the same wave do not depend
+           on each other and can be handled in parallel. if no addon is ready,
+           optional edges into waiting addons are dropped first, then the
+           first mandatory cycle that only waits for itself is loaded as a
+           group. returns the 'order', the 'levels' (waves), the mandatory
+           'cycles' and the dropped optional edges as 'broken' pairs.
+        """
+        with STATS.phase ( "load-order" ):
+            return self.order_waves()
+
+
+    def order_waves ( self ):
+        """run the waves of compute_load_order"""
+        waiting = {}
+        for addon_id, ( mandatory, optional ) in self.edges.items():
+            mandatory = { name_id for name_id in mandatory if name_id in self.addons }
+            optional = { name_id for name_id in optional if name_id in self.addons }
+            mandatory.discard ( addon_id )
+            optional.discard ( addon_id )
+            waiting [ addon_id ] = [ len ( mandatory ), len ( optional - mandatory ) ]
+
+        cycles = self.find_cycles()
+        broken = []
+        levels = []
+        ready = [ addon_id for addon_id, counts in waiting.items() if counts == [ 0, 0 ] ]
+        while waiting:
+            if not ready:
+                ready = self.release_blocked ( waiting, broken )
+            for addon_id in ready:
+                del waiting [ addon_id ]
+            levels.append ( ready )
+
+            following = []
+            for name_id in ready:
+                entry = self.direct_dependents.get ( name_id )
+                if entry is None:
+                    continue
+                for dependency_type, position in ( ( 'mandatory', 0 ), ( 'optional', 1 ) ):
+                    for addon_id in entry [ dependency_type ]:
+                        counts = waiting.get ( addon_id )
+                        if counts is None:
+                            continue
+                        if position == 1 and addon_id in entry['mandatory']:
+                            continue
+                        counts [ position ] -= 1
+                        if counts == [ 0, 0 ]:
+                            following.append ( addon_id )
+            ready = following
+
+        levels = [
+            sorted ( ( NAMES.get_name ( addon_id ) for addon_id in level ), key=str.casefold )
+            for level in levels
+        ]
+        return {
+            'order': [ name for level in levels for name in level ],
+            'levels': levels,
+            'cycles': cycles,
+            'broken': [
+                ( NAMES.get_name ( addon_id ), NAMES.get_name ( name_id ) )
+                for addon_id, name_id in broken
+            ]
+        }
+
+
+    def release_blocked ( self, waiting, broken ):
+        """pick the addons to load next when every waiting addon is blocked"""
+        released = [ addon_id for addon_id, counts in waiting.items() if counts [0] == 0 ]
+        if not released:
+            # a mandatory cycle blocks, load the first one not waiting for others
+            components = {}
+            for addon_id in waiting:
+                reach = self.mandatory_reach [ addon_id ]
+                if addon_id in reach:
+                    components.setdefault ( id ( reach ), set() ).add ( addon_id )
+            for members in components.values():
+                if all ( name_id in members or name_id not in waiting
+                         for addon_id in members
+                         for name_id in self.mandatory_successors ( addon_id ) ):
+                    released = list ( members )
+                    break
+        for addon_id in released:
+            broken.extend (
+                ( addon_id, name_id ) for name_id in self.edges [ addon_id ][1]
+                if name_id in waiting and name_id != addon_id
+                and name_id not in self.edges [ addon_id ][0]
+            )
+            waiting [ addon_id ] = [ 0, 0 ]
+        return released
+
+
+
+    # db    db d88888b d8888b. .d8888. d888888b  .d88b.  d8b   db
+    # 88    88 88'     88  `8D 88'  YP   `88'   .8P  Y8. 888o  88
+    # Y8    8P 88ooooo 88oobY' `8bo.      88    88    88 88V8o 88
+    # `8b  d8' 88~~~~~ 88`8b     `Y8b.    88    88    88 88 V8o88
+    #  `8bd8'  88.     88 `88. db   8D   .88.   `8b  d8' 88  V888
+    #    YP    Y88888P 88   YD `8888Y' Y888888P  `Y88P'  VP   V8P
+
+
+    def build_version_edges ( self ):
+        """collect every version constrained edge of the install into flat
+           arrays: source ids, target ids, min keys and max keys, plus the
+           dependency objects for reporting. constraints whose versions
+           cannot be compared are collected separately.
+        """
+        sources = array ( "l" )
+        targets = array ( "l" )
+        min_keys = array ( "q" )
+        max_keys = array ( "q" )
+        dependencies = []
+        unparseable = []
+        for addon_id, addon in self.addons.items():
+            for mandatory, deps in ( ( True, addon.get_depends_on() ),
+                                     ( False, addon.get_optional_depends_on() ) ):
+                for dep in deps:
+                    if dep.min_version is None and dep.max_version is None:
+                        continue
+                    if ( ( dep.min_version is not None and dep.min_key is None ) or
+                         ( dep.max_version is not None and dep.max_key is None ) ):
+                        unparseable.append ( ( addon_id, mandatory, dep ) )
+                        continue
+                    sources.append ( addon_id )
+                    targets.append ( dep.get_target_id() )
+                    min_keys.append (
+                        self.NO_MIN_VERSION if dep.min_key is None else dep.min_key
+                    )
+                    max_keys.append (
+                        self.NO_MAX_VERSION if dep.max_key is None else dep.max_key
+                    )
+                    dependencies.append ( ( mandatory, dep ) )
+        by_target = {}
+        for index, target in enumerate ( targets ):
+            by_target.setdefault ( target, [] ).append ( index )
+        self.version_edges = {
+            'sources': sources,
+            'targets': targets,
+            'min_keys': min_keys,
+            'max_keys': max_keys,
+            'dependencies': dependencies,
+            'unparseable': unparseable,
+            'by_target': by_target
+        }
+        return self.version_edges
+
+
+    def check_version_constraints ( self ):
+        """check every version constrained edge against the AddOnVersion of
+           the installed target in one pass over the edge arrays.
+           a target without AddOnVersion counts as version 0, like in game.
+           edges to addons that are not installed are skipped, they are
+           reported as missing dependencies.
+           returns a dict with a list of 'unsatisfied' constraints and a list
+           of 'unparseable' constraints that could not be checked.
+        """
+        edges = self.version_edges
+        if edges is None:
+            edges = self.build_version_edges()
+        installed = {
+            addon_id: addon.get_addon_version_key() or 0
+            for addon_id, addon in self.addons.items()
+        }
+        unsatisfied = []
+        for index, ( source, target, min_key, max_key ) in enumerate ( zip (
+                edges['sources'], edges['targets'], edges['min_keys'], edges['max_keys'] ) ):
+            version = installed.get ( target )
+            if version is not None and not min_key <= version <= max_key:
+                unsatisfied.append ( self.version_report (
+                    source, *edges['dependencies'] [ index ]
+                ) )
+        return {
+            'unsatisfied': unsatisfied,
+            'unparseable': [
+                self.version_report ( source, mandatory, dep )
+                for source, mandatory, dep in edges['unparseable']
+            ]
+        }
+
+
+    def find_version_conflicts ( self ):
+        """intersect all version constraints of the install per target.
+           constraints are grouped by target, then the lower bounds and the
+           upper bounds of each group are sorted once. the feasible range is
+           [highest minimum, lowest maximum]. if it is empty, the conflicting
+           addons are the ones whose minimum lies above the lowest maximum
+           and the ones whose maximum lies below the highest minimum,
+           both found by bisecting the sorted bounds. O(E log E) overall.
+           returns a dict target name -> report for every constrained target.
+        """
+        edges = self.version_edges
+        if edges is None:
+            edges = self.build_version_edges()
+
+        result = {}
+        for target, indices in edges['by_target'].items():
+            lows = sorted (
+                ( edges['min_keys'] [ index ], edges['sources'] [ index ] )
+                for index in indices if edges['min_keys'] [ index ] != self.NO_MIN_VERSION
+            )
+            highs = sorted (
+                ( edges['max_keys'] [ index ], edges['sources'] [ index ] )
+                for index in indices if edges['max_keys'] [ index ] != self.NO_MAX_VERSION
+            )
+            feasible_min = lows [-1][0] if lows else None
+            feasible_max = highs [0][0] if highs else None
+
+            conflicts = { 'minimums': [], 'maximums': [] }
+            if feasible_min is not None and feasible_max is not None and feasible_min > feasible_max:
+                # minimums above the lowest maximum, maximums below the highest minimum
+                above = lows [ bisect_right ( lows, ( feasible_max, len ( NAMES ) ) ): ]
+                below = highs [ :bisect_left ( highs, ( feasible_min, -1 ) ) ]
+                conflicts['minimums'] = [
+                    { 'addon': NAMES.get_name ( source ), 'min_version': key }
+                    for key, source in above
+                ]
+                conflicts['maximums'] = [
+                    { 'addon': NAMES.get_name ( source ), 'max_version': key }
+                    for key, source in below
+                ]
+                feasible = False
+            else:
+                feasible = True
+
+            addon = self.addons.get ( target )
+            installed = None if addon is None else addon.get_addon_version_key() or 0
+            # installed targets are reported by their own name, not a DependsOn spelling
+            name = NAMES.get_name ( target ) if addon is None else addon.get_name()
+            result [ name ] = {
+                'constraints': len ( indices ),
+                'feasible': feasible,
+                'min_version': feasible_min,
+                'max_version': feasible_max,
+                'conflicts': conflicts,
+                'installed_version': installed,
+                'satisfies_all': (
+                    feasible and installed is not None
+                    and ( feasible_min is None or feasible_min <= installed )
+                    and ( feasible_max is None or installed <= feasible_max )
+                )
+            }
+        return result
+
+
+    def version_report ( self, source, mandatory, dep, addons=None ):
+        """describe a version constrained edge for reporting.
+           the installed version is looked up in addons (id -> addon),
+           which defaults to the installed addons.
+        """
+        if addons is None:
+            addons = self.addons
+        target = addons.get ( dep.get_target_id() )
+        return {
+            'addon': NAMES.get_name ( source ),
+            'dependency': dep.get_name(),
+            'mandatory': mandatory,
+            'min_version': dep.min_version,
+            'max_version': dep.max_version,
+            'installed_version': None if target is None else target.get_addon_version()
+        }
+
+
+
+    # .d8888. d888888b .88b  d88. db    db db       .d8b.  d888888b d88888b
+    # 88'  YP   `88'   88'YbdP`88 88    88 88      d8' `8b `~~88~~' 88'
+    # `8bo.      88    88  88  88 88    88 88      88ooo88    88    88ooooo
+    #   `Y8b.    88    88  88  88 88    88 88      88~~~88    88    88~~~~~
+    # db   8D   .88.   88  88  88 88b  d88 88booo. 88   88    88    88.
+    # `8888Y' Y888888P YP  YP  YP ~Y8888P' Y88888P YP   YP    YP    Y88888P
+
+
+    def simulate ( self, remove=(), add=() ):
+        """report what would change if the addons named in remove were
+           uninstalled and the addons in add were installed. an addon in add
+           replaces an installed addon of the same name, so a version change
+           is simulated by adding an addon with the new version.
+           the matrix is not modified: changed edges are kept in an overlay
+           and only the addons depending on a changed one are recomputed,
+           everything else is taken from the existing closure memo.
+           returns the 'removed', 'added' and 'affected' addon names and the
+           changes in 'missing' dependencies and 'versions'. every change
+           is split into what 'breaks' and what gets 'fixed'.
+        """
+        with STATS.phase ( "simulate" ):
+            overlay = {}
+            for addon_name in remove:
+                overlay [ self.lookup_id ( addon_name ) ] = None
+            for addon in add:
+                overlay [ addon.get_addon_id() ] = addon
+
+            affected = set()
+            for name_id in overlay:
+                affected.update ( self.affected_by ( name_id ) )
+            installed = {
+                name_id for name_id in affected
+                if ( overlay [ name_id ] is not None if name_id in overlay
+                     else name_id in self.addons )
+            }
+
+            closure = self.simulate_closure ( overlay, affected, installed )
+            missing = self.simulate_missing ( overlay, closure )
+            versions = self.simulate_versions ( overlay )
+
+        return {
+            'removed': sorted (
+                ( NAMES.get_name ( name_id ) for name_id, addon in overlay.items()
+                  if addon is None and name_id in self.addons ), key=str.casefold
+            ),
+            'added': sorted (
+                ( addon.get_name() for addon in overlay.values() if addon is not None ),
+                key=str.casefold
+            ),
+            'affected': sorted (
+                ( NAMES.get_name ( name_id ) for name_id in installed ), key=str.casefold
+            ),
+            'missing': missing,
+            'versions': versions
+        }
+
+
+    def simulate_closure ( self, overlay, affected, installed ):
+        """compute the closure of the installed affected addons with the
+           overlay applied, starting from copies of the reachability memo
+        """
+        def mandatory_successors ( addon_id ):
+            if addon_id in overlay:
+                addon = overlay [ addon_id ]
+                return () if addon is None else tuple ( addon.get_depends_on_ids() )
+            return self.mandatory_successors ( addon_id )
+
+        def all_successors ( addon_id ):
+            if addon_id in overlay:
+                addon = overlay [ addon_id ]
+                if addon is None:
+                    return ()
+                return tuple ( addon.get_depends_on_ids() ) + tuple (
+                    addon.get_optional_depends_on_ids()
+                )
+            return self.all_successors ( addon_id )
+
+        mandatory_reach = self.mandatory_reach.copy()
+        full_reach = self.full_reach.copy()
+        for name_id in affected:
+            mandatory_reach.pop ( name_id, None )
+            full_reach.pop ( name_id, None )
+        self.compute_reachability ( installed, mandatory_successors, mandatory_reach )
+        self.compute_reachability ( installed, all_successors, full_reach )
+
+        closure = {}
+        for addon_id in installed:
+            mandatory = mandatory_reach [ addon_id ] - { addon_id }
+            closure [ addon_id ] = {
+                'mandatory': mandatory,
+                'optional': full_reach [ addon_id ] - mandatory - { addon_id }
+            }
+        return closure
+
+
+    def simulate_missing ( self, overlay, closure ):
+        """compare the missing dependencies of the simulated closure with
+           the current ones, removed addons are left out
+        """
+        # every dependency target that is not installed, now and simulated
+        missing_before = {
+            name_id for name_id in self.direct_dependents if name_id not in self.addons
+        }
+        missing_after = set ( missing_before )
+        for name_id, addon in overlay.items():
+            if addon is None:
+                missing_after.add ( name_id )
+            else:
+                missing_after.discard ( name_id )
+        for addon in overlay.values():
+            if addon is not None:
+                missing_after.update (
+                    name_id for name_id in addon.get_depends_on_ids()
+                    + addon.get_optional_depends_on_ids()
+                    if name_id not in self.addons and name_id not in overlay
+                )
+
+        # report addons sorted by name, like everything else
+        ordered = sorted ( closure, key=lambda addon_id: NAMES.get_name ( addon_id ).casefold() )
+        result = {}
+        for dependency_type in ( 'mandatory', 'optional' ):
+            breaks = {}
+            fixed = {}
+            for addon_id in ordered:
+                entry = closure [ addon_id ]
+                after = entry [ dependency_type ] & missing_after
+                before = set()
+                if addon_id in self.closure or addon_id in self.snapshot_closure:
+                    before = self.get_closure_entry ( addon_id ) [ dependency_type ] & missing_before
+                name = NAMES.get_name ( addon_id )
+                if after - before:
+                    breaks [ name ] = sorted (
+                        ( NAMES.get_name ( name_id ) for name_id in after - before ),
+                        key=str.casefold
+                    )
+                if before - after:
+                    fixed [ name ] = sorted (
+                        ( NAMES.get_name ( name_id ) for name_id in before - after ),
+                        key=str.casefold
+                    )
+            result [ dependency_type ] = { 'breaks': breaks, 'fixed': fixed }
+        return result
+
+
+    def simulate_versions ( self, overlay ):
+        """compare version constraints of every target touched by the overlay:
+           the changed addons themselves and the targets of their constraints.
+           returns the unsatisfied constraints and the targets whose
+           constraints cannot be satisfied together, as breaks and fixes.
+        """
+        edges = self.version_edges
+        if edges is None:
+            edges = self.build_version_edges()
+
+        # constraints added by the overlay, per target
+        added = {}
+        targets = set ( overlay )
+        for name_id, addon in overlay.items():
+            if name_id in self.addons:
+                targets.update (
+                    dep.get_target_id() for dep in self.addons [ name_id ].get_combined_dependencies()
+                )
+            if addon is None:
+                continue
+            for mandatory, deps in ( ( True, addon.get_depends_on() ),
+                                     ( False, addon.get_optional_depends_on() ) ):
+                for dep in deps:
+                    targets.add ( dep.get_target_id() )
+                    if dep.min_version is None and dep.max_version is None:
+                        continue
+                    if ( ( dep.min_version is not None and dep.min_key is None ) or
+                         ( dep.max_version is not None and dep.max_key is None ) ):
+                        continue
+                    added.setdefault ( dep.get_target_id(), [] ).append (
+                        ( name_id, mandatory, dep )
+                    )
+
+        simulated = dict ( self.addons )
+        for name_id, addon in overlay.items():
+            if addon is None:
+                simulated.pop ( name_id, None )
+            else:
+                simulated [ name_id ] = addon
+
+        result = {
+            'unsatisfied': { 'breaks': [], 'fixed': [] },
+            'conflicts': { 'breaks': [], 'fixed': [] }
+        }
+        for target in targets:
+            current = [
+                ( edges['sources'] [ index ], ) + edges['dependencies'] [ index ]
+                for index in edges['by_target'].get ( target, () )
+            ]
+            constraints = [
+                constraint for constraint in current if constraint [0] not in overlay
+            ] + added.get ( target, [] )
+
+            before = self.unsatisfied_constraints ( current, self.addons.get ( target ) )
+            after = self.unsatisfied_constraints ( constraints, simulated.get ( target ) )
+            result['unsatisfied']['breaks'].extend (
+                self.version_report ( source, mandatory, dep, simulated )
+                for source, mandatory, dep in after if ( source, mandatory, dep ) not in before
+            )
+            # a constraint on a removed target is not fixed, it became a missing dependency
+            if simulated.get ( target ) is not None:
+                result['unsatisfied']['fixed'].extend (
+                    self.version_report ( source, mandatory, dep )
+                    for source, mandatory, dep in before
+                    if ( source, mandatory, dep ) not in after
+                    and simulated.get ( source ) is not None
+                )
+
+            feasible_before = self.constraints_feasible ( current )
+            feasible_after = self.constraints_feasible ( constraints )
+            addon = simulated.get ( target ) or self.addons.get ( target )
+            name = NAMES.get_name ( target ) if addon is None else addon.get_name()
+            if feasible_before and not feasible_after:
+                result['conflicts']['breaks'].append ( name )
+            elif feasible_after and not feasible_before:
+                result['conflicts']['fixed'].append ( name )
+
+        for name in ( 'breaks', 'fixed' ):
+            result['unsatisfied'][ name ].sort (
+                key=lambda entry: ( entry['addon'].casefold(), entry['dependency'].casefold() )
+            )
+            result['conflicts'][ name ].sort ( key=str.casefold )
+        return result
+
+
+    @staticmethod
+    def unsatisfied_constraints ( constraints, target ):
+        """return the (source, mandatory, dep) constraints the installed
+           target does not satisfy, none if it is not installed
+        """
+        if target is None:
+            return []
+        version = target.get_addon_version_key() or 0
+        return [
+            ( source, mandatory, dep ) for source, mandatory, dep in constraints
+            if not dep.is_satisfied_by ( version )
+        ]
+
+
+    @staticmethod
+    def constraints_feasible ( constraints ):
+        """return whether some version satisfies all (source, mandatory, dep) constraints"""
+        lowest = max ( ( dep.min_key for _, _, dep in constraints if dep.min_key is not None ),
+                       default=None )
+        highest = min ( ( dep.max_key for _, _, dep in constraints if dep.max_key is not None ),
+                        default=None )
+        return lowest is None or highest is None or lowest <= highest
+
+
+
+    def diff ( self, addon_list ):
+        """compare the install of this matrix with another one, given as
+           dict of addons like the constructor takes. addons are compared by
+           fingerprint, only changed ones and their dependents are recomputed
+           through simulate. returns the simulate result (with 'added' and
+           'removed' addons, 'missing' and 'versions' changes) plus the
+           addons whose fingerprint 'changed' and their 'version_changes'.
+        """
+        with STATS.phase ( "diff" ):
+            other = { addon.get_addon_id(): addon for addon in addon_list.values() }
+            removed = [
+                addon.get_name() for addon_id, addon in self.addons.items() if addon_id not in other
+            ]
+            changed = [
+                addon for addon_id, addon in other.items()
+                if addon_id not in self.addons
+                or self.addons [ addon_id ].get_fingerprint() != addon.get_fingerprint()
+            ]
+        result = self.simulate ( remove=removed, add=changed )
+
+        result['added'] = sorted (
+            ( addon.get_name() for addon in changed if addon.get_addon_id() not in self.addons ),
+            key=str.casefold
+        )
+        result['changed'] = []
+        result['version_changes'] = []
+        for addon in sorted ( changed, key=lambda addon: addon.get_name().casefold() ):
+            previous = self.addons.get ( addon.get_addon_id() )
+            if previous is None:
+                continue
+            result['changed'].append ( addon.get_name() )
+            if ( previous.get_version() != addon.get_version()
+                 or previous.get_addon_version() != addon.get_addon_version() ):
+                result['version_changes'].append ( {
+                    'addon': addon.get_name(),
+                    'version': [ previous.get_version(), addon.get_version() ],
+                    'addon_version': [ previous.get_addon_version(), addon.get_addon_version() ]
+                } )
+        return result
+
+
+
+    # db    db d8b   db db    db .d8888. d88888b d8888b.
+    # 88    88 888o  88 88    88 88'  YP 88'     88  `8D
+    # 88    88 88V8o 88 88    88 `8bo.   88ooooo 88   88
+    # 88    88 88 V8o88 88    88   `Y8b. 88~~~~~ 88   88
+    # 88b  d88 88  V888 88b  d88 db   8D 88.     88  .8D
+    # ~Y8888P' VP   V8P ~Y8888P' `8888Y' Y88888P Y8888D'
+
+
+    def sweep ( self, queue, successors, kept ):
+        """mark everything reachable from the ids in queue.
+           kept maps each marked id to the id that caused the mark.
+           returns the list of newly marked ids.
+        """
+        marked = []
+        position = 0
+        while position < len ( queue ):
+            addon_id = queue [ position ]
+            position += 1
+            for name_id in successors ( addon_id ):
+                if name_id in self.addons and name_id not in kept:
+                    kept [ name_id ] = addon_id
+                    queue.append ( name_id )
+                    marked.append ( name_id )
+        return marked
+
+
+    def find_unused_libraries ( self ):
+        """mark and sweep from all addons that are not libraries.
+           libraries never reached can be removed. kept libraries are
+           reported with the addon that first required them, split into
+           libraries needed by mandatory chains and libraries only used
+           through an optional dependency somewhere along the way.
+           every addon and edge is visited at most twice.
+        """
+        roots = [
+            addon_id for addon_id, addon in self.addons.items() if not addon.is_library()
+        ]
+        kept = dict.fromkeys ( roots )
+        mandatory = self.sweep ( list ( roots ), self.mandatory_successors, kept )
+        optional = self.sweep ( roots + mandatory, self.all_successors, kept )
+
+        # interned names keep the first spelling seen, which may come from a
+        # DependsOn entry, report the names the addons are installed with
+        def reasons ( marked ):
+            return {
+                self.addons [ addon_id ].get_name(): self.addons [ kept [ addon_id ] ].get_name()
+                for addon_id in marked if self.addons [ addon_id ].is_library()
+            }
+
+        return {
+            'unused': sorted (
+                ( addon.get_name() for addon_id, addon in self.addons.items()
+                  if addon_id not in kept ),
+                key=str.casefold
+            ),
+            'mandatory': reasons ( mandatory ),
+            'optional':  reasons ( optional )
+        }
+
+
+
+    # .d8888. d8b   db  .d8b.  d8888b. .d8888. db   db  .d88b.  d888888b
+    # 88'  YP 888o  88 d8' `8b 88  `8D 88'  YP 88   88 .8P  Y8. `~~88~~'
+    # `8bo.   88V8o 88 88ooo88 88oodD' `8bo.   88ooo88 88    88    88
+    #   `Y8b. 88 V8o88 88~~~88 88~~~     `Y8b. 88~~~88 88    88    88
+    # db   8D 88  V888 88   88 88      db   8D 88   88 `8b  d8'    88
+    # `8888Y' VP   V8P YP   YP 88      `8888Y' YP   YP  `Y88P'     YP
+
+
+    def save_snapshot ( self, filename, stamp ):
+        """write the computed state to a snapshot file, valid for stamp"""
+        MatrixSnapshot ( filename ).write ( self, stamp )
+
+
+    @classmethod
+    def load_snapshot ( cls, filename, stamp ):
+        """create a matrix from a snapshot file without computing anything
+           expensive. returns None if there is no valid snapshot for stamp.
+        """
+        state = MatrixSnapshot ( filename ).read ( stamp )
+        if state is None:
+            return None
+        matrix = cls.__new__ ( cls )
+        matrix.reset ( state['addon_list'] )
+        matrix.build_edges()
+        for addon_id in matrix.addons:
+            matrix.index_direct_dependents ( addon_id )
+        matrix.mandatory_reach = state['mandatory_reach']
+        matrix.full_reach = state['full_reach']
+        matrix.transitive_dependents = state['transitive_dependents']
+        matrix.snapshot_closure = set ( matrix.addons )
+        for name, encoded in state['reduced'].items():
+            matrix.snapshot_reduced [ matrix.addon_list [ name ].get_addon_id() ] = encoded
+        for name, conflicts in state['conflicts'].items():
+            matrix.conflicts [ name ] = {
+                dependency_type: [
+                    dict ( conflict, conflicting=Dependency.from_dict ( conflict['conflicting'] ) )
+                    for conflict in entries
+                ]
+                for dependency_type, entries in conflicts.items()
+            }
+        STATS.count ( "snapshot addons", len ( matrix.addons ) )
+        return matrix
+
+
+
+    def get_reduced ( self, addon_id ):
+        """return the reduced dependencies of an addon, decoding them first
+           if the matrix was loaded from a snapshot
+        """
+        encoded = self.snapshot_reduced.pop ( addon_id, None )
+        if encoded is not None:
+            blob, start, end = encoded
+            mandatory, optional = MatrixSnapshot.load_reduced ( memoryview ( blob ) [ start:end ] )
+            self.matrix [ addon_id ] = {
+                'mandatory': [ Dependency.from_dict ( dep ) for dep in mandatory ],
+                'optional':  [ Dependency.from_dict ( dep ) for dep in optional ]
+            }
+        return self.matrix [ addon_id ]
+
+
+
+    #  d888b  d88888b d888888b
+    # 88' Y8b 88'     `~~88~~'
+    # 88      88ooooo    88
+    # 88  ooo 88~~~~~    88
+    # 88. ~8~ 88.        88
+    #  Y888P  Y88888P    YP
+
+
+    def lookup_id ( self, addon_name ):
+        """return the id of an installed addon, names are not case sensitive.
+           raises KeyError if the addon is not installed
+        """
+        addon_id = NAMES.lookup ( addon_name )
+        if addon_id is None or addon_id not in self.addons:
+            raise KeyError ( addon_name )
+        return addon_id
+
+    def get_closure ( self, addon_name ):
+        """return the sets of transitive mandatory and optional dependency names"""
+        closure = self.get_closure_entry ( self.lookup_id ( addon_name ) )
+        return {
+            'mandatory': { NAMES.get_name ( name_id ) for name_id in closure['mandatory'] },
+            'optional':  { NAMES.get_name ( name_id ) for name_id in closure['optional'] }
+        }
+
+    def get_dependencies ( self, addon_name ):
+        """return the reduced mandatory and optional dependencies of an addon"""
+        return self.get_reduced ( self.lookup_id ( addon_name ) )
+
+    def get_conflicts ( self ):
+        """return version conflicts found while reducing, keyed by addon name"""
+        return self.conflicts
+
+    def get_missing ( self, addon_name ):
+        """return the names of transitive dependencies that are not installed"""
+        closure = self.get_closure_entry ( self.lookup_id ( addon_name ) )
+        return {
+            'mandatory': {
+                NAMES.get_name ( name_id ) for name_id in closure['mandatory']
+                if name_id not in self.addons
+            },
+            'optional':  {
+                NAMES.get_name ( name_id ) for name_id in closure['optional']
+                if name_id not in self.addons
+            }
+        }
+
+    def get_dependents ( self, addon_name, transitive=True ):
+        """return the names of addons depending on addon_name, split into
+           mandatory and optional. works for missing addons as well.
+           with transitive=False only direct dependents are returned.
+        """
+        index = self.transitive_dependents if transitive else self.direct_dependents
+        name_id = NAMES.lookup ( addon_name )
+        entry = index.get ( name_id ) if name_id is not None else None
+        if entry is None:
+            return { 'mandatory': set(), 'optional': set() }
+        return {
+            'mandatory': { NAMES.get_name ( addon_id ) for addon_id in entry['mandatory'] },
+            'optional':  { NAMES.get_name ( addon_id ) for addon_id in entry['optional'] }
+        }
@@ -0,0 +1,111 @@
+"""provides per phase timers, counters and tracing"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+LOGGER = logging.getLogger ( "dependencies" )
+
+# phases in the order they usually run, used to order the summary
+PHASES = (
+    "discover",
+    "read",
+    "detect-encoding",
+    "tokenize",
+    "closure",
+    "reduce",
+    "load-order",
+    "scan-sources",
+    "saved-variables",
+    "report",
+)
+
+
+
+class Instrumentation:
+    """collects time spent per phase and named counters
+       timings are accumulated, so a phase may be entered many times,
+       e.g. once per file. tracing goes through logging and is only
+       formatted if the debug level is enabled.
+    """
+
+    timings = None
+    counters = None
+
+
+    def __init__(self):
+        """start with empty timings and counters"""
+        self.reset()
+
+
+    def __repr__(self):
+        return f"Instrumentation ({len ( self.timings )} phases, {len ( self.counters )} counters)"
+
+
+    def reset ( self ):
+        """forget everything collected so far"""
+        self.timings = {}
+        self.counters = {}
+
+
+    @contextmanager
+    def phase ( self, name ):
+        """time the enclosed block and add it to the named phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings [ name ] = self.timings.get ( name, 0.0 ) + time.perf_counter() - start
+
+
+    def count ( self, name, amount=1 ):
+        """add amount to the named counter"""
+        self.counters [ name ] = self.counters.get ( name, 0 ) + amount
+
+
+    @staticmethod
+    def trace ( message, *args ):
+        """log a debug message, arguments are only formatted if it is shown"""
+        if LOGGER.isEnabledFor ( logging.DEBUG ):
+            LOGGER.debug ( message, *args )
+
+
+
+    def snapshot ( self ):
+        """return timings and counters as a dict of plain values"""
+        return {
+            "timings": dict ( self.timings ),
+            "counters": dict ( self.counters )
+        }
+
+
+    def merge ( self, snapshot ):
+        """add a snapshot, e.g. one returned by a worker process"""
+        for name, seconds in snapshot["timings"].items():
+            self.timings [ name ] = self.timings.get ( name, 0.0 ) + seconds
+        for name, amount in snapshot["counters"].items():
+            self.count ( name, amount )
+
+
+    def summary ( self ):
+        """return a human readable summary"""
+        names = [ name for name in PHASES if name in self.timings ]
+        names.extend ( sorted ( name for name in self.timings if name not in PHASES ) )
+        lines = [ "timings:" ]
+        for name in names:
+            lines.append ( f"    {name:20s}: {self.timings [ name ] * 1000:10.2f} ms" )
+        lines.append ( "counters:" )
+        for name in sorted ( self.counters ):
+            lines.append ( f"    {name:20s}: {self.counters [ name ]:10d}" )
+        return "\n".join ( lines )
+
+
+    def to_json ( self ):
+        """return timings in seconds and counters as a json profile"""
+        return json.dumps ( self.snapshot(), indent=2, sort_keys=True )
+
+
+
+# the process wide instance
+STATS = Instrumentation()
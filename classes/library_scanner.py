@@ -0,0 +1,245 @@
+"""provides a scanner finding library references in addon sources"""
+
+import mmap
+import re
+from concurrent.futures import ProcessPoolExecutor
+from os import scandir
+from pathlib import Path
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.instrumentation import LOGGER, STATS
+# pylint: enable=import-error
+
+# lua identifiers, a library name must not be part of a longer one.
+# digits may follow, so LibAddonMenu also matches the LibAddonMenu2 global.
+NAME_START = rb"(?<![A-Za-z0-9_])"
+NAME_END = rb"(?![A-Za-z_])"
+# "-2.0" and similar suffixes of folder names are not part of lua globals
+VERSION_SUFFIX = re.compile ( r"[-.][0-9][0-9.]*$" )
+# $(language) and similar placeholders in file lists
+PLACEHOLDER = re.compile ( r"\$\([^)]*\)" )
+# file types containing lua code
+SOURCE_EXTENSIONS = ( ".lua", ".xml" )
+# number of addons handed to a worker at once
+SCAN_CHUNK_SIZE = 16
+
+
+
+def library_aliases ( name ):
+    """return the spellings a library may be referenced by in lua code"""
+    aliases = { name, VERSION_SUFFIX.sub ( "", name ), re.sub ( r"[^A-Za-z0-9_]", "", name ) }
+    return { alias for alias in aliases if alias }
+
+
+
+def trie_pattern ( words ):
+    """return a regular expression matching any of the given byte strings.
+       the words are merged into a trie first and the trie is written as
+       nested alternations, so the regex engine follows shared prefixes
+       once instead of trying every word at every position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for byte in word:
+            node = node.setdefault ( byte, {} )
+        node [ None ] = True
+
+    def emit ( node ):
+        branches = [
+            re.escape ( bytes ( ( byte, ) ) ) + emit ( child )
+            for byte, child in sorted ( ( byte, child ) for byte, child in node.items()
+                                        if byte is not None )
+        ]
+        if not branches:
+            return b""
+        if len ( branches ) == 1 and None not in node:
+            return branches [0]
+        pattern = b"(?:" + b"|".join ( branches ) + b")"
+        return pattern + b"?" if None in node else pattern
+
+    return emit ( trie )
+
+
+
+def scan_file ( path, pattern ):
+    """return the lowercased matches of pattern in a file and its size.
+       the file is memory mapped, so it is never read into memory as a whole.
+    """
+    with open ( path, "rb" ) as file:
+        size = file.seek ( 0, 2 )
+        if size == 0:
+            return set(), 0
+        with mmap.mmap ( file.fileno(), 0, access=mmap.ACCESS_READ ) as data:
+            return { match.lower() for match in pattern.findall ( data ) }, size
+
+
+
+def scan_addon_sources ( pattern, addons ):
+    """search the files of addons for pattern.
+       addons is a list of (name, [files]), returns a list of
+       (name, set of lowercased matches).
+    """
+    results = []
+    for name, files in addons:
+        found = set()
+        for path in files:
+            try:
+                with STATS.phase ( "scan-sources" ):
+                    matches, size = scan_file ( path, pattern )
+            except OSError as error:
+                LOGGER.warning ( "could not scan %s: %s", path, error )
+                continue
+            STATS.count ( "source files" )
+            STATS.count ( "source bytes", size )
+            found.update ( matches )
+        results.append ( ( name, found ) )
+    return results
+
+
+
+def scan_addon_chunk ( job ):
+    """scan a chunk of addons in a worker process.
+       job is (pattern source, addons) as taken by scan_addon_sources.
+       returns the results and the instrumentation collected meanwhile,
+       so the parent process can merge it into its own.
+    """
+    STATS.reset()
+    source, addons = job
+    results = scan_addon_sources ( re.compile ( source, re.IGNORECASE ), addons )
+    return results, STATS.snapshot()
+
+
+
+class LibraryScanner:
+    """finds out which libraries the addons really use.
+       all lua and xml files of an addon are searched for the names of the
+       installed libraries in a single pass per file, using one regular
+       expression built from a trie of all names. folders of addons bundled
+       inside another addon are left out, they are scanned on their own.
+       the result is compared with the declared dependencies.
+    """
+
+    def __init__(self, extensions=( ".addon", ".txt" )):
+        """extensions are those of description files, to recognize bundled addons"""
+        self.extensions = extensions
+
+
+    def __repr__(self):
+        return "LibraryScanner"
+
+
+
+    def find_sources ( self, addon ):
+        """return the source files of an addon: the lua and xml files in its
+           folder, except those of bundled addons, and the files listed in
+           its description file.
+        """
+        description_file = addon.get_description_file()
+        if description_file is None:
+            return []
+        folder = Path ( description_file ).parent
+        sources = set()
+        bundled = []
+        pending = [ folder ]
+        while pending:
+            directory = pending.pop()
+            try:
+                with scandir ( directory ) as iterator:
+                    entries = list ( iterator )
+            except OSError:
+                continue
+            names = { entry.name.casefold() for entry in entries }
+            if directory != folder and any (
+                    Path ( directory ).name.casefold() + extension in names
+                    for extension in self.extensions ):
+                bundled.append ( Path ( directory ) )
+                continue
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.name.startswith ( "." ):
+                        pending.append ( entry.path )
+                elif entry.name.lower().endswith ( SOURCE_EXTENSIONS ):
+                    sources.add ( entry.path )
+
+        for listed in addon.get_files():
+            listed = listed.replace ( "\\", "/" )
+            if not listed.lower().endswith ( SOURCE_EXTENSIONS ):
+                continue
+            if PLACEHOLDER.search ( listed ):
+                paths = folder.glob ( PLACEHOLDER.sub ( "*", listed ) )
+            else:
+                paths = [ folder / listed ]
+            for path in paths:
+                if path.is_file() and not any ( root in path.parents for root in bundled ):
+                    sources.add ( str ( path ) )
+        return sorted ( sources )
+
+
+    def scan ( self, addons, libraries, workers=1 ):
+        """search the sources of addons for the names of libraries.
+           returns a dict addon name -> set of library names found,
+           addons without any source file are left out.
+        """
+        aliases = {}
+        for library in libraries:
+            for alias in library_aliases ( library ):
+                aliases [ alias.lower().encode ( "utf-8" ) ] = library
+        if not aliases:
+            return {}
+        source = NAME_START + b"(" + trie_pattern ( sorted ( aliases ) ) + b")" + NAME_END
+
+        jobs = [ ( addon.get_name(), self.find_sources ( addon ) ) for addon in addons ]
+        jobs = [ ( name, files ) for name, files in jobs if files ]
+        if workers == 1 or len ( jobs ) <= SCAN_CHUNK_SIZE:
+            results = scan_addon_sources ( re.compile ( source, re.IGNORECASE ), jobs )
+        else:
+            chunks = [
+                ( source, jobs [ start:start + SCAN_CHUNK_SIZE ] )
+                for start in range ( 0, len ( jobs ), SCAN_CHUNK_SIZE )
+            ]
+            results = []
+            with ProcessPoolExecutor ( max_workers=workers ) as pool:
+                for chunk_results, snapshot in pool.map ( scan_addon_chunk, chunks ):
+                    results.extend ( chunk_results )
+                    STATS.merge ( snapshot )
+
+        return {
+            name: { aliases [ match ] for match in found if match in aliases }
+            for name, found in results
+        }
+
+
+    def check ( self, matrix, workers=1 ):
+        """compare the libraries used in the sources with the declared ones.
+           returns a dict addon name -> {'undeclared': [...], 'unused': [...]}
+           for every addon with differences. only installed libraries can
+           be recognized, so unused declarations of missing ones are not
+           reported. addons without source files are skipped.
+        """
+        libraries = {
+            addon.get_name(): addon_id for addon_id, addon in matrix.addons.items()
+            if addon.is_library()
+        }
+        used = self.scan ( list ( matrix.addons.values() ), libraries, workers )
+        report = {}
+        for addon in matrix.addons.values():
+            if addon.get_name() not in used:
+                continue
+            found = used [ addon.get_name() ] - { addon.get_name() }
+            declared = {
+                dep.get_target_id() for dep in addon.get_combined_dependencies()
+            }
+            undeclared = sorted (
+                ( library for library in found if libraries [ library ] not in declared ),
+                key=str.casefold
+            )
+            unused = sorted (
+                ( library for library, library_id in libraries.items()
+                  if library_id in declared and library not in found ),
+                key=str.casefold
+            )
+            if undeclared or unused:
+                report [ addon.get_name() ] = { 'undeclared': undeclared, 'unused': unused }
+        return report
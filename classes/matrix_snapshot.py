@@ -0,0 +1,430 @@
+"""provides a binary snapshot file of a computed dependency matrix"""
+
+import hashlib
+import marshal
+import mmap
+import struct
+from array import array
+from os import stat
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.addon import Addon
+from classes.instrumentation import LOGGER, STATS
+from classes.name_table import NAMES
+# pylint: enable=import-error
+
+
+def manifest_stamp ( description_files ):
+    """return a digest of the paths, mtimes and sizes of the description files.
+       a snapshot is only valid for the install it was written from.
+    """
+    digest = hashlib.blake2b ( digest_size=16 )
+    for description_file in sorted ( description_files ):
+        try:
+            file_stat = stat ( description_file )
+        except OSError:
+            continue
+        digest.update ( description_file.encode ( "utf-8", "surrogateescape" ) )
+        digest.update ( struct.pack ( "<qq", file_stat.st_mtime_ns, file_stat.st_size ) )
+    return digest.digest()
+
+
+
+class SnapshotRows ( dict ):
+    """a dict read from a snapshot whose values are decoded on first use.
+       every key starts out mapped to the index of its row in the file,
+       decode_row turns that into the real value the first time the key
+       is looked up. behaves like the plain dicts computed by the matrix.
+    """
+
+    def __init__(self, key_rows, ids):
+        """map key -> row index, ids maps file local ids to process ids"""
+        dict.__init__ ( self, key_rows )
+        self.ids = ids
+
+
+    def decode_row ( self, row ):
+        """return the value stored in row"""
+        raise NotImplementedError
+
+
+    def decode_ids ( self, rows, values, row ):
+        """return the process ids in row of a compressed sparse row relation"""
+        return map ( self.ids.__getitem__, values [ rows [ row ]:rows [ row + 1 ] ] )
+
+
+    def __getitem__(self, key):
+        value = dict.__getitem__ ( self, key )
+        if isinstance ( value, int ):
+            value = self.decode_row ( value )
+            dict.__setitem__ ( self, key, value )
+        return value
+
+
+    def get ( self, key, default=None ):
+        """return the value of key, or default"""
+        return self [ key ] if key in self else default
+
+
+    def pop ( self, key, *default ):
+        """remove key and return its value"""
+        if key in self:
+            value = self [ key ]
+            dict.__delitem__ ( self, key )
+            return value
+        return dict.pop ( self, key, *default )
+
+
+    def values ( self ):
+        """return every value, decoding all rows"""
+        return [ self [ key ] for key in self ]
+
+
+    def items ( self ):
+        """return (key, value) pairs, decoding all rows"""
+        return [ ( key, self [ key ] ) for key in self ]
+
+
+    def copy ( self ):
+        """return a shallow copy, rows not decoded yet stay encoded"""
+        result = dict.__new__ ( type ( self ) )
+        dict.update ( result, dict.copy ( self ) )
+        result.__dict__.update ( self.__dict__ )
+        return result
+
+
+
+class SnapshotReach ( SnapshotRows ):
+    """a reachability memo read from a snapshot. members of a strongly
+       connected component share a row and get the same frozenset, like
+       the sets shared in computed memos.
+    """
+
+    def __init__(self, key_rows, ids, rows, values):
+        """rows and values as written by dump_sets"""
+        SnapshotRows.__init__ ( self, key_rows, ids )
+        self.rows = rows
+        self.values_array = values
+        self.shared = {}
+
+
+    def decode_row ( self, row ):
+        value = self.shared.get ( row )
+        if value is None:
+            value = self.shared [ row ] = frozenset (
+                self.decode_ids ( self.rows, self.values_array, row )
+            )
+        return value
+
+
+
+class SnapshotDependents ( SnapshotRows ):
+    """the transitive dependents index read from a snapshot, entries are
+       decoded into mutable sets so incremental updates can change them
+    """
+
+    def __init__(self, key_rows, ids, relations):
+        """relations maps 'mandatory' and 'optional' to (rows, values)
+           as written by dump_dependents
+        """
+        SnapshotRows.__init__ ( self, key_rows, ids )
+        self.relations = relations
+
+
+    def decode_row ( self, row ):
+        return {
+            dependency_type: set ( self.decode_ids ( rows, values, row ) )
+            for dependency_type, ( rows, values ) in self.relations.items()
+        }
+
+
+
+class MatrixSnapshot:
+    """reads and writes the computed state of a dependency matrix.
+       the file starts with a header (magic, format version, addon model
+       version, validity stamp) and a table of (offset, length) sections:
+       the name table as utf-8 blob with an offset array, the addon data
+       and reduced dependencies as marshal data, and the reachability sets
+       and transitive dependents as compressed sparse rows (an index array
+       and a value array per relation). ids in the file are positions in
+       its own name table, they are mapped to process ids when loading.
+       arrays are read straight from the memory mapped file, reachability
+       rows are only decoded when they are looked up.
+    """
+
+    MAGIC = b"SYCMTRX\0"
+    # bump whenever the layout changes, older files are ignored
+    FORMAT_VERSION = 1
+
+    HEADER = struct.Struct ( "<8sII16sI" )
+    SECTION = struct.Struct ( "<QQ" )
+
+    SECTIONS = (
+        "name_offsets", "names", "addons", "reduced_offsets", "reduced", "conflicts",
+        "mandatory_set", "mandatory_rows", "mandatory_values",
+        "full_set", "full_rows", "full_values",
+        "dependents_mandatory_rows", "dependents_mandatory_values",
+        "dependents_optional_rows", "dependents_optional_values",
+    )
+
+
+    def __init__(self, filename):
+        """prepare reading or writing filename"""
+        self.filename = filename
+
+
+    def __repr__(self):
+        return f"MatrixSnapshot ({self.filename})"
+
+
+
+    # db   d8b   db d8888b. d888888b d888888b d88888b
+    # 88   I8I   88 88  `8D   `88'   `~~88~~' 88'
+    # 88   I8I   88 88oobY'    88       88    88ooooo
+    # Y8   I8I   88 88`8b      88       88    88~~~~~
+    # `8b d8'8b d8' 88 `88.   .88.      88    88.
+    #  `8b8' `8d8'  88   YD Y888888P    YP    Y88888P
+
+
+    def write ( self, matrix, stamp ):
+        """write the computed state of matrix, valid for stamp"""
+        with STATS.phase ( "snapshot" ):
+            # local ids: every name the matrix knows about, in process id order
+            known = set ( matrix.mandatory_reach )
+            known.update ( matrix.full_reach )
+            known.update ( matrix.transitive_dependents )
+            local_ids = sorted ( known )
+            local = { name_id: index for index, name_id in enumerate ( local_ids ) }
+
+            names = [ NAMES.get_name ( name_id ).encode ( "utf-8" ) for name_id in local_ids ]
+            name_offsets = array ( "I", [ 0 ] )
+            for name in names:
+                name_offsets.append ( name_offsets [-1] + len ( name ) )
+
+            addons = [ addon.to_dict() for addon in matrix.addon_list.values() ]
+            # one marshal blob per addon, so they can be decoded one by one
+            reduced = [
+                marshal.dumps ( self.dump_reduced ( matrix.get_reduced ( addon.get_addon_id() ) ) )
+                for addon in matrix.addon_list.values()
+            ]
+            reduced_offsets = array ( "I", [ 0 ] )
+            for blob in reduced:
+                reduced_offsets.append ( reduced_offsets [-1] + len ( blob ) )
+            conflicts = {
+                name: {
+                    dependency_type: [
+                        dict ( conflict, conflicting=conflict['conflicting'].to_dict() )
+                        for conflict in entries
+                    ]
+                    for dependency_type, entries in types.items()
+                }
+                for name, types in matrix.conflicts.items()
+            }
+
+            sections = {
+                "name_offsets": name_offsets.tobytes(),
+                "names": b"".join ( names ),
+                "addons": marshal.dumps ( addons ),
+                "reduced_offsets": reduced_offsets.tobytes(),
+                "reduced": b"".join ( reduced ),
+                "conflicts": marshal.dumps ( conflicts ),
+            }
+            for prefix, reach in ( ( "mandatory", matrix.mandatory_reach ),
+                                   ( "full", matrix.full_reach ) ):
+                node_sets, rows, values = self.dump_sets ( reach, local_ids, local )
+                sections [ prefix + "_set" ] = node_sets.tobytes()
+                sections [ prefix + "_rows" ] = rows.tobytes()
+                sections [ prefix + "_values" ] = values.tobytes()
+            for dependency_type in ( "mandatory", "optional" ):
+                rows, values = self.dump_dependents (
+                    matrix.transitive_dependents, dependency_type, local_ids, local
+                )
+                sections [ f"dependents_{dependency_type}_rows" ] = rows.tobytes()
+                sections [ f"dependents_{dependency_type}_values" ] = values.tobytes()
+
+            offset = self.HEADER.size + self.SECTION.size * len ( self.SECTIONS )
+            table = []
+            for name in self.SECTIONS:
+                # keep every section aligned for memoryview casts
+                offset += -offset % 8
+                table.append ( ( offset, len ( sections [ name ] ) ) )
+                offset += len ( sections [ name ] )
+
+            with open ( self.filename, "wb" ) as file:
+                file.write ( self.HEADER.pack (
+                    self.MAGIC, self.FORMAT_VERSION, Addon.MODEL_VERSION, stamp,
+                    len ( self.SECTIONS )
+                ) )
+                for entry in table:
+                    file.write ( self.SECTION.pack ( *entry ) )
+                for name, ( offset, _ ) in zip ( self.SECTIONS, table ):
+                    file.write ( b"\0" * ( offset - file.tell() ) )
+                    file.write ( sections [ name ] )
+            STATS.count ( "snapshot bytes", offset )
+
+
+    @staticmethod
+    def dump_reduced ( reduced ):
+        """return reduced dependencies as plain values"""
+        return (
+            [ dep.to_dict() for dep in reduced['mandatory'] ],
+            [ dep.to_dict() for dep in reduced['optional'] ]
+        )
+
+
+    @staticmethod
+    def load_reduced ( blob ):
+        """return the plain values of reduced dependencies written by write"""
+        return marshal.loads ( blob )
+
+
+    @staticmethod
+    def dump_sets ( reach, local_ids, local ):
+        """store reachability sets once each, members of a strongly connected
+           component share one set. returns the set index of every node and
+           the rows and values of the sets.
+        """
+        node_sets = array ( "i" )
+        rows = array ( "I", [ 0 ] )
+        values = array ( "I" )
+        seen = {}
+        for name_id in local_ids:
+            node_set = reach.get ( name_id )
+            if node_set is None:
+                node_sets.append ( -1 )
+                continue
+            index = seen.get ( id ( node_set ) )
+            if index is None:
+                index = seen [ id ( node_set ) ] = len ( rows ) - 1
+                values.extend ( sorted ( local [ member ] for member in node_set ) )
+                rows.append ( len ( values ) )
+            node_sets.append ( index )
+        return node_sets, rows, values
+
+
+    @staticmethod
+    def dump_dependents ( dependents, dependency_type, local_ids, local ):
+        """return rows and values of one type of the transitive dependents"""
+        rows = array ( "I", [ 0 ] )
+        values = array ( "I" )
+        for name_id in local_ids:
+            entry = dependents.get ( name_id )
+            if entry is not None:
+                values.extend ( sorted ( local [ member ] for member in entry [ dependency_type ] ) )
+            rows.append ( len ( values ) )
+        return rows, values
+
+
+
+    # d8888b. d88888b  .d8b.  d8888b.
+    # 88  `8D 88'     d8' `8b 88  `8D
+    # 88oobY' 88ooooo 88ooo88 88   88
+    # 88`8b   88~~~~~ 88~~~88 88   88
+    # 88 `88. 88.     88   88 88  .8D
+    # 88   YD Y88888P YP   YP Y8888D'
+
+
+    def read ( self, stamp ):
+        """load the snapshot if it is valid for stamp.
+           returns a dict with the 'addon_list' (name -> addon), the encoded
+           'reduced' dependencies per addon name as (blob, start, end) for
+           load_reduced, the 'conflicts', the 'mandatory_reach' and
+           'full_reach' memos and the 'transitive_dependents' index,
+           all using process ids. returns None if the file is missing,
+           of another version or written for another install.
+        """
+        try:
+            file = open ( self.filename, "rb" )  # pylint: disable=consider-using-with
+        except OSError:
+            return None
+        with file, STATS.phase ( "snapshot" ):
+            try:
+                data = mmap.mmap ( file.fileno(), 0, access=mmap.ACCESS_READ )
+            except ( OSError, ValueError ):
+                return None
+            view = memoryview ( data )
+            try:
+                return self.read_sections ( view, stamp )
+            finally:
+                view.release()
+                data.close()
+
+
+    def read_sections ( self, view, stamp ):
+        """decode the mapped file, see read"""
+        if len ( view ) < self.HEADER.size:
+            return None
+        magic, format_version, model_version, file_stamp, count = self.HEADER.unpack_from ( view )
+        if ( magic != self.MAGIC or format_version != self.FORMAT_VERSION
+             or model_version != Addon.MODEL_VERSION or count != len ( self.SECTIONS ) ):
+            LOGGER.info ( "snapshot %s has another format, ignored", self.filename )
+            return None
+        if file_stamp != stamp:
+            LOGGER.info ( "snapshot %s is outdated, ignored", self.filename )
+            return None
+
+        sections = {}
+        for index, name in enumerate ( self.SECTIONS ):
+            offset, length = self.SECTION.unpack_from (
+                view, self.HEADER.size + index * self.SECTION.size
+            )
+            sections [ name ] = view [ offset:offset + length ]
+
+        def cast ( name, typecode ):
+            return sections [ name ].cast ( typecode )
+
+        def copy ( name, typecode ):
+            # the mapping is closed after reading, so a later save can replace the file
+            values = array ( typecode )
+            values.frombytes ( sections [ name ] )
+            return values
+
+        name_offsets = cast ( "name_offsets", "I" )
+        names = bytes ( sections["names"] )
+        ids = [
+            NAMES.intern ( names [ name_offsets [ index ]:name_offsets [ index + 1 ] ].decode ( "utf-8" ) )
+            for index in range ( len ( name_offsets ) - 1 )
+        ]
+
+        addon_list = {}
+        for data in marshal.loads ( sections["addons"] ):
+            addon = Addon.from_dict ( data )
+            addon_list [ addon.get_name() ] = addon
+        # reduced dependencies stay encoded until they are asked for
+        reduced_offsets = cast ( "reduced_offsets", "I" )
+        blob = bytes ( sections["reduced"] )
+        reduced = {
+            name: ( blob, reduced_offsets [ index ], reduced_offsets [ index + 1 ] )
+            for index, name in enumerate ( addon_list )
+        }
+
+        result = {
+            'addon_list': addon_list,
+            'reduced': reduced,
+            'conflicts': marshal.loads ( sections["conflicts"] )
+        }
+        for prefix in ( "mandatory", "full" ):
+            node_sets = cast ( prefix + "_set", "i" )
+            result [ prefix + "_reach" ] = SnapshotReach (
+                {
+                    ids [ index ]: node_set
+                    for index, node_set in enumerate ( node_sets ) if node_set >= 0
+                },
+                ids, copy ( prefix + "_rows", "I" ), copy ( prefix + "_values", "I" )
+            )
+        relations = {
+            dependency_type: (
+                copy ( f"dependents_{dependency_type}_rows", "I" ),
+                copy ( f"dependents_{dependency_type}_values", "I" )
+            )
+            for dependency_type in ( "mandatory", "optional" )
+        }
+        result['transitive_dependents'] = SnapshotDependents (
+            {
+                name_id: index for index, name_id in enumerate ( ids )
+                if any ( rows [ index ] != rows [ index + 1 ] for rows, _ in relations.values() )
+            },
+            ids, relations
+        )
+        return result
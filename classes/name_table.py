@@ -0,0 +1,56 @@
+"""provides a table of interned addon names"""
+
+class NameTable:
+    """interns addon names and hands out dense integer ids
+       names are compared casefolded, like ESO does on windows,
+       the first spelling seen is kept for display.
+    """
+
+    __slots__ = ( "ids", "names", "keys" )
+
+
+    def __init__(self):
+        """create an empty table"""
+        self.ids = {}
+        self.names = []
+        self.keys = []
+
+
+    def __repr__(self):
+        return f"NameTable ({len ( self.names )} names)"
+
+
+    def __len__(self):
+        return len ( self.names )
+
+
+    def intern ( self, name ):
+        """return the id of name, adding it to the table if unknown"""
+        key = name.casefold()
+        name_id = self.ids.get ( key )
+        if name_id is None:
+            name_id = len ( self.names )
+            self.ids [ key ] = name_id
+            self.names.append ( name )
+            self.keys.append ( key )
+        return name_id
+
+
+    def lookup ( self, name ):
+        """return the id of name, or None if it was never interned"""
+        return self.ids.get ( name.casefold() )
+
+
+    def get_name ( self, name_id ):
+        """return the display name of an id"""
+        return self.names [ name_id ]
+
+
+    def get_key ( self, name_id ):
+        """return the casefolded name of an id"""
+        return self.keys [ name_id ]
+
+
+
+# the process wide table, ids are only valid within one process
+NAMES = NameTable()
@@ -0,0 +1,180 @@
+"""provides an analysis of the SavedVariables folder"""
+
+import json
+import mmap
+import re
+import time
+from os import scandir
+
+# pamper pylint stupidity
+# pylint: disable=import-error
+from classes.instrumentation import LOGGER, STATS
+# pylint: enable=import-error
+
+# a top level assignment starts a line, nested table entries are indented.
+# starting with the newline lets the regex engine skip ahead to the next
+# line break instead of trying every position, the first line is matched
+# on its own.
+VARIABLE_PATTERN = re.compile ( rb"\n([A-Za-z_][A-Za-z0-9_]*)[ \t]*=" )
+FIRST_VARIABLE_PATTERN = re.compile ( rb"([A-Za-z_][A-Za-z0-9_]*)[ \t]*=" )
+# files written by the game itself, not by an addon
+GAME_FILE_PREFIX = "ZO_"
+
+
+
+def scan_saved_variables_file ( path ):
+    """return the names of the top level variables in a SavedVariables file.
+       the file is memory mapped and searched in place, so even files of
+       several hundred megabytes are never read into memory as a whole.
+    """
+    with open ( path, "rb" ) as file:
+        if file.seek ( 0, 2 ) == 0:
+            return []
+        with mmap.mmap ( file.fileno(), 0, access=mmap.ACCESS_READ ) as data:
+            names = VARIABLE_PATTERN.findall ( data )
+            first = FIRST_VARIABLE_PATTERN.match ( data )
+            if first is not None:
+                names.insert ( 0, first.group ( 1 ) )
+    result = []
+    for name in names:
+        name = name.decode ( "ascii" )
+        if name not in result:
+            result.append ( name )
+    return result
+
+
+
+class SavedVariablesScanner:
+    """matches the files in the SavedVariables folder with the installed addons.
+       every file is searched for its top level variables, which are compared
+       with the SavedVariables declared by the addons. a file is an orphan if
+       no installed addon is named like it or declares one of its variables.
+       sizes are recorded in a json history file, so growth between runs
+       can be reported.
+    """
+
+    # size entries kept per file in the history
+    HISTORY_LENGTH = 30
+
+    def __init__(self, folder, history_file=None):
+        """analyze the SavedVariables folder, recording sizes in history_file if given"""
+        self.folder = folder
+        self.history_file = history_file
+
+
+    def __repr__(self):
+        return f"SavedVariablesScanner ({self.folder})"
+
+
+
+    def scan ( self ):
+        """return a list of dicts with 'file', 'size', 'modified' and 'variables'
+           for every lua file in the folder
+        """
+        result = []
+        try:
+            with scandir ( self.folder ) as iterator:
+                entries = sorted (
+                    ( entry for entry in iterator
+                      if entry.is_file() and entry.name.lower().endswith ( ".lua" ) ),
+                    key=lambda entry: entry.name.casefold()
+                )
+        except OSError as error:
+            LOGGER.warning ( "could not read %s: %s", self.folder, error )
+            return result
+        for entry in entries:
+            try:
+                file_stat = entry.stat()
+                with STATS.phase ( "saved-variables" ):
+                    variables = scan_saved_variables_file ( entry.path )
+            except OSError as error:
+                LOGGER.warning ( "could not scan %s: %s", entry.path, error )
+                continue
+            STATS.count ( "saved variables files" )
+            STATS.count ( "saved variables bytes", file_stat.st_size )
+            result.append ( {
+                'file': entry.name,
+                'size': file_stat.st_size,
+                'modified': file_stat.st_mtime,
+                'variables': variables
+            } )
+        return result
+
+
+    def check ( self, matrix ):
+        """compare the folder with the installed addons of matrix.
+           returns a dict with the 'files' sorted by size, each with its
+           'owners', the 'undeclared' variables no installed addon declares,
+           whether it is an 'orphan' and its 'growth' since the last run and
+           since the oldest recorded run ('growth_since' is the time of that
+           run), plus the names and total sizes of all files and of the orphans.
+        """
+        declared = {}
+        names = {}
+        for addon in matrix.addons.values():
+            names [ addon.get_name().casefold() ] = addon.get_name()
+            for variable in addon.get_saved_variables():
+                declared.setdefault ( variable, set() ).add ( addon.get_name() )
+
+        files = self.scan()
+        history = self.load_history()
+        now = time.time()
+        for entry in files:
+            stem = entry['file'] [ :-len ( ".lua" ) ]
+            owners = set()
+            if stem.casefold() in names:
+                owners.add ( names [ stem.casefold() ] )
+            for variable in entry['variables']:
+                owners.update ( declared.get ( variable, () ) )
+            entry['owners'] = sorted ( owners, key=str.casefold )
+            entry['undeclared'] = [
+                variable for variable in entry['variables'] if variable not in declared
+            ]
+            entry['orphan'] = not owners and not stem.startswith ( GAME_FILE_PREFIX )
+
+            sizes = history.get ( entry['file'], [] )
+            entry['growth'] = entry['size'] - sizes [-1] [1] if sizes else None
+            entry['growth_total'] = entry['size'] - sizes [0] [1] if sizes else None
+            entry['growth_since'] = sizes [0] [0] if sizes else None
+            sizes.append ( [ now, entry['size'] ] )
+            history [ entry['file'] ] = sizes [ -self.HISTORY_LENGTH: ]
+
+        # forget removed files, so a file created again starts fresh
+        present = { entry['file'] for entry in files }
+        self.save_history ( {
+            name: sizes for name, sizes in history.items() if name in present
+        } )
+        files.sort ( key=lambda entry: -entry['size'] )
+        orphans = [ entry for entry in files if entry['orphan'] ]
+        return {
+            'files': files,
+            'orphans': [ entry['file'] for entry in orphans ],
+            'total_size': sum ( entry['size'] for entry in files ),
+            'orphan_size': sum ( entry['size'] for entry in orphans )
+        }
+
+
+
+    def load_history ( self ):
+        """return the recorded sizes, file name -> list of [time, size]"""
+        if self.history_file is None:
+            return {}
+        try:
+            with open ( self.history_file, "r", encoding="utf-8" ) as file:
+                return json.load ( file ) ["files"]
+        except FileNotFoundError:
+            return {}
+        except ( OSError, ValueError, KeyError, TypeError ) as error:
+            LOGGER.warning ( "ignoring history %s: %s", self.history_file, error )
+            return {}
+
+
+    def save_history ( self, history ):
+        """write the recorded sizes"""
+        if self.history_file is None:
+            return
+        try:
+            with open ( self.history_file, "w", encoding="utf-8" ) as file:
+                json.dump ( { "files": history }, file )
+        except OSError as error:
+            LOGGER.warning ( "could not write history %s: %s", self.history_file, error )
@@ -3,135 +3,967 @@
     place in a directory next to ESOs live directory
     (or place it anywhere and change the ADDON_ROOT line)
     run with python 3.
-    takes no parameters and prints it output to the command line
+    prints its output to the command line, run with --help for options.
     """
 
-from os import listdir
-from os.path import exists, join
+import argparse
+import atexit
+import json
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import scandir, stat
+from os.path import dirname, join
+from pathlib import Path
 
 # pamper pylint stupidity
 # pylint: disable=import-error
-from classes.addon import Addon
+from classes.addon import Addon, select_installed_copies
+from classes.addon_cache import AddonCache, file_digest
+from classes.addon_server import AddonServer
+from classes.addon_watcher import AddonWatcher
 from classes.dependency_matrix import DependencyMatrix
+from classes.instrumentation import LOGGER, STATS
+from classes.library_scanner import LibraryScanner
+from classes.matrix_snapshot import manifest_stamp
+from classes.name_table import NAMES
+from classes.saved_variables import SavedVariablesScanner
 # pylint: enable=import-error
 
-VERBOSITY = 5
+# 0: errors only, 1: warnings, 2: info, 3 and above: trace every step
+VERBOSITY = 1
+
+# number of worker processes used to parse description files.
+# 1 parses serially, None uses one worker per cpu.
+PARSE_WORKERS = 1
+# number of description files handed to a worker at once
+PARSE_CHUNK_SIZE = 16
+
+# streaming mode: number of chunks parsed ahead of the consumer
+STREAM_BUFFER_CHUNKS = 4
+
+# parsed description files are kept here between runs, None disables caching
+CACHE_FILE = join ( dirname ( __file__ ), "addon_cache.sqlite" )
+# computed matrix, reused while no description file changed, None disables it
+SNAPSHOT_FILE = join ( dirname ( __file__ ), "addon_matrix.snapshot" )
+# sizes of SavedVariables files, kept to report their growth, None disables it
+SAVED_VARIABLES_HISTORY = join ( dirname ( __file__ ), "saved_variables_history.json" )
+# SavedVariables files larger than this many bytes are marked as large
+SAVED_VARIABLES_LARGE = 10 * 1024 * 1024
 
 
 #ADDON_ROOT = join ( "..", "live", "Addons" )
 ADDON_ROOT = "C:\\Users\\sychr\\Documents\\Elder Scrolls Online\\live\\Addons"
 
+# ESO loads addons nested up to this many folders below ADDON_ROOT,
+# e.g. Addons/SomeAddon/libs/LibFoo/LibFoo.txt
+MAX_ADDON_DEPTH = 3
+# description file extensions, in order of precedence
+DESCRIPTION_EXTENSIONS = ( ".addon", ".txt" )
+
+# --serve listens on this address, only local clients should be able to connect
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+# seconds between checks for changed description files while serving, None to disable
+SERVER_POLL_INTERVAL = 2.0
+
+
+
+def find_valid_addon_description_files ( root_dir, max_depth=MAX_ADDON_DEPTH ):
+    """Scan addon directory to find all addon description files.
+       Yields paths as they are found. Folders are descended up to max_depth
+       levels, so libraries bundled inside other addons are found as well.
+       Only directory listings are read, file types come from the cached
+       directory entries, so no file is stat'ed on its own.
+    """
+    pending = [ ( root_dir, 0 ) ]
+    while pending:
+        directory, depth = pending.pop()
+        try:
+            with STATS.phase ( "discover" ):
+                with scandir ( directory ) as iterator:
+                    entries = list ( iterator )
+        except OSError:
+            continue
+        STATS.count ( "directories" )
+
+        if 0 < depth:
+            folder = Path ( directory ).name.casefold()
+            files = {
+                entry.name.casefold(): entry for entry in entries
+                if not entry.is_dir()
+            }
+            for extension in DESCRIPTION_EXTENSIONS:
+                entry = files.get ( folder + extension )
+                if entry is not None:
+                    STATS.count ( "description files" )
+                    yield entry.path
+                    break
+
+        if depth < max_depth:
+            # reversed, so folders are visited in listing order
+            for entry in reversed ( entries ):
+                if entry.is_dir() and not entry.name.startswith ( "." ):
+                    pending.append ( ( entry.path, depth + 1 ) )
+
+
+
+def parse_addon_file ( description_file ):
+    """parse a single addon description file.
+       returns a tuple (addon, error), exactly one of them is None.
+    """
+    try:
+        return Addon ( description_file ), None
+    except ( OSError, UnicodeError, LookupError ) as error:
+        return None, f"{type(error).__name__}: {error}"
+
+
+
+def read_addon_info_files (
+        description_files, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE, errors=None
+    ):
+    """open and parse every addon description file, compiling a dict of addons.
+       with more than one worker, files are parsed in chunks by a process pool,
+       the result keeps the order of description_files either way.
+       files that cannot be read are collected in errors (file -> message)
+       if a dict is given, otherwise they are logged as warnings.
+    """
+    description_files = list ( description_files )
+    results = parse_addon_files ( description_files, workers, chunk_size )
+    return collect_addon_info ( description_files, results, errors )
+
+
+
+def parse_addon_files ( description_files, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE ):
+    """parse a list of description files, returning a list of (addon, error)
+       in the same order. with more than one worker, files are parsed in
+       chunks by a process pool.
+    """
+    if workers == 1 or len ( description_files ) <= chunk_size:
+        return list ( map ( parse_addon_file, description_files ) )
+    chunks = [
+        description_files [ start:start + chunk_size ]
+        for start in range ( 0, len ( description_files ), chunk_size )
+    ]
+    results = []
+    with ProcessPoolExecutor ( max_workers=workers ) as pool:
+        for chunk_results, snapshot in pool.map ( parse_addon_chunk, chunks ):
+            results.extend ( chunk_results )
+            STATS.merge ( snapshot )
+    return results
+
+
+
+def collect_addon_info ( description_files, results, errors ):
+    """compile parse results into a dict of addons, handling per file errors.
+       of several copies of an addon, the one select_installed_copies picks is used.
+    """
+    addons = []
+    for description_file, ( addon, error ) in zip ( description_files, results ):
+        if addon is not None:
+            addons.append ( addon )
+        elif errors is not None:
+            errors [ description_file ] = error
+        else:
+            LOGGER.warning ( "could not read %s: %s", description_file, error )
+    return select_installed_copies ( addons )
+
+
+
+def read_cached_addon_info_files ( description_files, cache, **kwargs ):
+    """like read_addon_info_files, but only parse files that are not in the cache.
+       kwargs are passed on to parse_addon_files for the remaining files.
+       cache entries of files not in description_files are evicted.
+    """
+    description_files = list ( description_files )
+    addons = {}
+    stats = {}
+    missing = []
+    for description_file in description_files:
+        try:
+            stats [ description_file ] = stat ( description_file )
+        except OSError:
+            # let the parser report the unreadable file
+            missing.append ( description_file )
+            continue
+        addon = cache.lookup ( description_file, stats [ description_file ] )
+        if addon is None:
+            missing.append ( description_file )
+        else:
+            addons [ description_file ] = addon
+
+    if missing:
+        # keep the results per path, files sharing a name are different addons
+        results = parse_addon_files ( missing, **kwargs )
+        for description_file, ( addon, error ) in zip ( missing, results ):
+            if addon is None:
+                LOGGER.warning ( "could not read %s: %s", description_file, error )
+                continue
+            addons [ description_file ] = addon
+            if description_file in stats:
+                cache.store ( description_file, stats [ description_file ], addon )
+
+    cache.evict ( description_files )
+
+    return select_installed_copies (
+        addons [ description_file ] for description_file in description_files
+        if description_file in addons
+    )
+
 
 
-def find_valid_addon_description_files ( root_dir ):
-    """Scan addon directory to find all addon description files."""
-    addon_descriptions = []
-    for directory in listdir ( root_dir  ):
-        description = join ( root_dir, directory, f"{directory}.txt" )
-        if exists ( description ):
-            addon_descriptions.append ( description )
-    return addon_descriptions
+# .d8888. d888888b d8888b. d88888b  .d8b.  .88b  d88. d888888b d8b   db  d888b
+# 88'  YP `~~88~~' 88  `8D 88'     d8' `8b 88'YbdP`88   `88'   888o  88 88' Y8b
+# `8bo.      88    88oobY' 88ooooo 88ooo88 88  88  88    88    88V8o 88 88
+#   `Y8b.    88    88`8b   88~~~~~ 88~~~88 88  88  88    88    88 V8o88 88  ooo
+# db   8D    88    88 `88. 88.     88   88 88  88  88   .88.   88  V888 88. ~8~
+# `8888Y'    YP    88   YD Y88888P YP   YP YP  YP  YP Y888888P VP   V8P  Y888P
 
 
+def parse_addon_chunk ( description_files ):
+    """parse a chunk of description files in a worker process.
+       returns the results and the instrumentation collected meanwhile,
+       so the parent process can merge it into its own.
+    """
+    STATS.reset()
+    results = [ parse_addon_file ( description_file ) for description_file in description_files ]
+    return results, STATS.snapshot()
+
+
+
+def iter_addon_info_files (
+        description_files, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE, cache=None
+    ):
+    """lazily parse description files, yielding (file, addon, error) in input order.
+       with more than one worker, at most STREAM_BUFFER_CHUNKS chunks per worker
+       are parsed ahead of the consumer, so memory stays bounded on huge trees.
+       files found in cache are not parsed, newly parsed files are stored.
+    """
+    def cached ( description_file ):
+        if cache is None:
+            return None, None
+        try:
+            file_stat = stat ( description_file )
+        except OSError:
+            return None, None
+        return cache.lookup ( description_file, file_stat ), file_stat
+
+    def store ( description_file, file_stat, addon ):
+        if cache is not None and addon is not None and file_stat is not None:
+            cache.store ( description_file, file_stat, addon )
+
+    if workers == 1:
+        for description_file in description_files:
+            addon, file_stat = cached ( description_file )
+            error = None
+            if addon is None:
+                addon, error = parse_addon_file ( description_file )
+                store ( description_file, file_stat, addon )
+            yield description_file, addon, error
+        return
+
+    with ProcessPoolExecutor ( max_workers=workers ) as pool:
+        limit = STREAM_BUFFER_CHUNKS * ( workers or 1 )
+        pending = deque()
+        chunk = []
+
+        def submit():
+            # cache hits queued behind parsed files are not sent to the workers
+            files = [
+                description_file for description_file, _, addon in chunk if addon is None
+            ]
+            pending.append ( ( list ( chunk ), pool.submit ( parse_addon_chunk, files ) ) )
+            chunk.clear()
+
+        def drain():
+            entries, future = pending.popleft()
+            results, snapshot = future.result()
+            STATS.merge ( snapshot )
+            results = iter ( results )
+            for description_file, file_stat, addon in entries:
+                if addon is not None:
+                    yield description_file, addon, None
+                    continue
+                addon, error = next ( results )
+                store ( description_file, file_stat, addon )
+                yield description_file, addon, error
 
-def read_addon_info_files ( description_files ):
-    """open and parse every addon description file, compiling a dict of dicts."""
+        for description_file in description_files:
+            addon, file_stat = cached ( description_file )
+            if addon is not None:
+                # keep input order: a hit waits for earlier files still in flight
+                if pending or chunk:
+                    chunk.append ( ( description_file, file_stat, addon ) )
+                else:
+                    yield description_file, addon, None
+                continue
+            chunk.append ( ( description_file, file_stat, None ) )
+            if sum ( 1 for _, _, parsed in chunk if parsed is None ) >= chunk_size:
+                submit()
+            while len ( pending ) > limit:
+                yield from drain()
+        if chunk:
+            submit()
+        while pending:
+            yield from drain()
+
+
+
+def addon_record ( addon, missing ):
+    """compile the streamed json record of one addon"""
+    def dependency_list ( dependencies ):
+        return [
+            { "name": dep.get_name(), "min_version": dep.min_version,
+              "max_version": dep.max_version }
+            for dep in dependencies
+        ]
+    return {
+        "type": "addon",
+        "name": addon.get_name(),
+        "title": addon.get_title(),
+        "version": addon.get_version(),
+        "addon_version": addon.get_addon_version(),
+        "library": addon.is_library(),
+        "depends_on": dependency_list ( addon.get_depends_on() ),
+        "optional_depends_on": dependency_list ( addon.get_optional_depends_on() ),
+        "missing": missing
+    }
+
+
+
+def stream_addon_records ( parsed ):
+    """turn (file, addon, error) tuples into json records as early as possible.
+       an addon is emitted as soon as all its direct dependencies are known
+       to be installed. addons still waiting for a dependency when the scan
+       is done are emitted with those dependencies reported missing.
+       of several copies of an addon the one Addon.supersedes prefers counts:
+       if a later copy wins, its record is emitted again and replaces the
+       earlier one. finally a summary record with transitive results is emitted.
+    """
     addon_info = {}
+    copies = {}         # addon id -> copy counting as installed
+    installed = set()
+    waiting = {}        # dependency id -> addons waiting for it
+    unresolved = {}     # addon id -> (addon, set of dependency ids not seen yet)
+
+    for description_file, addon, error in parsed:
+        if addon is None:
+            yield { "type": "error", "file": description_file, "error": error }
+            continue
+        addon_id = addon.get_addon_id()
+        current = copies.get ( addon_id )
+        if current is not None:
+            STATS.count ( "duplicate copies" )
+            if not addon.supersedes ( current ):
+                continue
+            del addon_info [ current.get_name() ]
+            unresolved.pop ( addon_id, None )
+        copies [ addon_id ] = addon
+        addon_info [ addon.get_name() ] = addon
+        installed.add ( addon_id )
+
+        pending = {
+            name_id for name_id in addon.get_depends_on_ids()
+            if name_id not in installed
+        }
+        pending.update (
+            name_id for name_id in addon.get_optional_depends_on_ids()
+            if name_id not in installed
+        )
+        if pending:
+            unresolved [ addon_id ] = ( addon, pending )
+            for name_id in pending:
+                waiting.setdefault ( name_id, [] ).append ( addon_id )
+        else:
+            yield addon_record ( addon, { "mandatory": [], "optional": [] } )
+
+        for waiting_id in waiting.pop ( addon_id, () ):
+            if waiting_id not in unresolved:
+                # replaced by another copy that was not waiting any more
+                continue
+            waiting_addon, waiting_for = unresolved [ waiting_id ]
+            waiting_for.discard ( addon_id )
+            if not waiting_for:
+                del unresolved [ waiting_id ]
+                yield addon_record ( waiting_addon, { "mandatory": [], "optional": [] } )
+
+    for waiting_addon, waiting_for in unresolved.values():
+        yield addon_record ( waiting_addon, {
+            "mandatory": [
+                dep.get_name() for dep in waiting_addon.get_depends_on()
+                if dep.get_target_id() in waiting_for
+            ],
+            "optional": [
+                dep.get_name() for dep in waiting_addon.get_optional_depends_on()
+                if dep.get_target_id() in waiting_for
+            ]
+        } )
+
+    yield summary_record ( DependencyMatrix ( addon_info ) )
+
+
+
+def summary_record ( matrix ):
+    """compile the final json record with the transitive results"""
+    missing = {}
+    for name in matrix.addon_list:
+        entry = matrix.get_missing ( name )
+        if entry["mandatory"] or entry["optional"]:
+            missing [ name ] = {
+                dependency_type: sorted ( names, key=str.casefold )
+                for dependency_type, names in entry.items()
+            }
+    conflicts = {
+        name: {
+            dependency_type: [
+                dict ( conflict, conflicting=conflict["conflicting"].to_dict() )
+                for conflict in entries
+            ]
+            for dependency_type, entries in types.items()
+        }
+        for name, types in matrix.get_conflicts().items()
+    }
+    return {
+        "type": "summary",
+        "addons": len ( matrix.addon_list ),
+        "missing": missing,
+        "libraries": matrix.find_unused_libraries(),
+        "versions": matrix.check_version_constraints(),
+        # installed targets whose constraints exclude each other, plain
+        # unsatisfied constraints are in "versions", missing targets in "missing"
+        "version_conflicts": {
+            name: entry for name, entry in matrix.find_version_conflicts().items()
+            if not entry["feasible"] and entry["installed_version"] is not None
+        },
+        "conflicts": conflicts,
+        "load_order": matrix.compute_load_order()
+    }
+
+
+
+def print_jsonl ( records, output=sys.stdout ):
+    """write one json line per record, flushing so readers see it at once"""
+    for record in records:
+        output.write ( json.dumps ( record ) )
+        output.write ( "\n" )
+        output.flush()
+
+
+
+# d8888b.  .d8b.  d888888b  .o88b. db   db
+# 88  `8D d8' `8b `~~88~~' d8P  Y8 88   88
+# 88oooY' 88ooo88    88    8P      88ooo88
+# 88~~~b. 88~~~88    88    8b      88~~~88
+# 88   8D 88   88    88    Y8b  d8 88   88
+# Y8888P' YP   YP    YP     `Y88P' YP   YP
+
+
+def read_shared_addon_info_files (
+        description_files, parsed, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE
+    ):
+    """like read_addon_info_files, but every distinct description file is
+       parsed only once across calls. files are identified by the hash of
+       their content and their name (the addon name comes from the file name).
+       parsed maps these keys to the shared addons (None if parsing failed)
+       and is updated with the newly parsed files.
+    """
+    keys = {}
+    pending = {}
     for description_file in description_files:
-        addon = Addon ( description_file )
-        if addon is not None:
-            addon_info [addon.get_name()] =  addon
-    return addon_info
+        try:
+            with STATS.phase ( "read" ):
+                content_hash = file_digest ( description_file )
+        except OSError as error:
+            LOGGER.warning ( "could not read %s: %s", description_file, error )
+            continue
+        key = ( content_hash, Path ( description_file ).stem.casefold() )
+        keys [ description_file ] = key
+        if key not in parsed and key not in pending:
+            pending [ key ] = description_file
+    STATS.count ( "shared manifests", len ( keys ) - len ( pending ) )
+
+    results = parse_addon_files ( list ( pending.values() ), workers, chunk_size )
+    for ( key, description_file ), ( addon, error ) in zip ( pending.items(), results ):
+        if addon is None:
+            LOGGER.warning ( "could not read %s: %s", description_file, error )
+        parsed [ key ] = addon
+
+    return select_installed_copies (
+        parsed [ key ] for key in keys.values() if parsed [ key ] is not None
+    )
+
+
+
+def batch_records ( roots, workers=PARSE_WORKERS ):
+    """analyze several addon folders, yielding one summary record per folder
+       and finally an aggregate record counting in how many folders each
+       addon is installed, each dependency is missing, each library is
+       unused, each installed addon has version requirements it does not
+       satisfy and each has requirements excluding each other.
+       manifests found in several folders are parsed once and shared.
+    """
+    parsed = {}
+    files = 0
+    installed = {}
+    missing = { "mandatory": {}, "optional": {} }
+    unused = {}
+    unsatisfied = {}
+    version_conflicts = {}
+
+    def counted ( counts, names ):
+        for name in names:
+            counts [ name ] = counts.get ( name, 0 ) + 1
+
+    for root in roots:
+        description_files = list ( find_valid_addon_description_files ( root ) )
+        files += len ( description_files )
+        matrix = DependencyMatrix (
+            read_shared_addon_info_files ( description_files, parsed, workers )
+        )
+        record = summary_record ( matrix )
+        record.update ( type="root", root=root, files=len ( description_files ) )
+        yield record
+
+        counted ( installed, matrix.addon_list )
+        for dependency_type, counts in missing.items():
+            counted ( counts, {
+                name for entry in record["missing"].values()
+                for name in entry.get ( dependency_type, () )
+            } )
+        counted ( unused, record["libraries"]["unused"] )
+        # by installed name, DependsOn entries may spell it differently
+        counted ( unsatisfied, {
+            matrix.addons [ NAMES.lookup ( entry["dependency"] ) ].get_name()
+            for entry in record["versions"]["unsatisfied"]
+        } )
+        counted ( version_conflicts, record["version_conflicts"] )
+
+    def by_count ( counts ):
+        return dict ( sorted ( counts.items(), key=lambda item: ( -item[1], item[0].casefold() ) ) )
+
+    yield {
+        "type": "aggregate",
+        "roots": len ( roots ),
+        "files": files,
+        "manifests": len ( parsed ),
+        "installed": by_count ( installed ),
+        "missing": {
+            dependency_type: by_count ( counts ) for dependency_type, counts in missing.items()
+        },
+        "unused": by_count ( unused ),
+        "unsatisfied": by_count ( unsatisfied ),
+        "version_conflicts": by_count ( version_conflicts )
+    }
 
 
 
-def print_dependency_matrix( addons ):
+# db   d8b   db  .d8b.  d888888b  .o88b. db   db
+# 88   I8I   88 d8' `8b `~~88~~' d8P  Y8 88   88
+# 88   I8I   88 88ooo88    88    8P      88ooo88
+# Y8   I8I   88 88~~~88    88    8b      88~~~88
+# `8b d8'8b d8' 88   88    88    Y8b  d8 88   88
+#  `8b8' `8d8'  YP   YP    YP     `Y88P' YP   YP
+
+
+def watch_records ( matrix, affected, removed ):
+    """compile the json records after a batch of changes: one per addon
+       whose results were recomputed, one per removed addon and a summary
+    """
+    for addon_id in sorted ( affected, key=NAMES.get_key ):
+        addon = matrix.addons.get ( addon_id )
+        if addon is None:
+            continue
+        missing = matrix.get_missing ( addon.get_name() )
+        yield addon_record ( addon, {
+            dependency_type: sorted ( names, key=str.casefold )
+            for dependency_type, names in missing.items()
+        } )
+    for name in sorted ( removed, key=str.casefold ):
+        yield { "type": "removed", "name": name }
+    yield summary_record ( matrix )
+
+
+
+def watch_addon_folder ( root_dir ):
+    """return a watcher for the addon folder, call start on it to read the folder"""
+    return AddonWatcher (
+        lambda: find_valid_addon_description_files ( root_dir ), parse_addon_file
+    )
+
+
+
+def report_changes ( watcher, jsonl=False ):
+    """report again after every batch of changes seen by a started watcher"""
+    matrix = watcher.matrix
+    for affected, removed in watcher.watch():
+        LOGGER.info ( "%d addons recomputed, %d removed", len ( affected ), len ( removed ) )
+        with STATS.phase ( "report" ):
+            if jsonl:
+                print_jsonl ( watch_records ( matrix, affected, removed ) )
+            else:
+                print_dependency_matrix ( matrix )
+                print_complications ( matrix )
+
+
+
+def print_name_list ( label, names ):
+    """print a labelled, sorted list of names if it is not empty"""
+    if 0 < len ( names ):
+        print ( label, ", ".join ( sorted ( names, key=str.casefold ) ) )
+
+
+
+def print_dependency_matrix( matrix ):
     """Dump dependency matrix to screen."""
-    for name in addons:
-        print ( addons[name]["Title"] )
-        if "uses" in addons [ name ]:
-            if "mandatory" in addons [name]["uses"]:
-                if 0 < len ( addons [name]["uses"]["mandatory"] ):
-                    print ("    Satisfied mandatory dependencies: ", end="")
-                    for dep in addons [name]["uses"]["mandatory"]:
-                        print ( dep, end=", " )
-                    print()
-            if "optional" in addons [name]["uses"]:
-                if 0 < len ( addons [name]["uses"]["optional"] ):
-                    print ("    Satisfied optional  dependencies: ", end="")
-                    for dep in addons [name]["uses"]["optional"]:
-                        print ( dep, end=", " )
-                    print()
-        if "usedBy" in addons [ name ]:
-            if "mandatory" in addons [name]["usedBy"]:
-                if 0 < len ( addons [name]["usedBy"]["mandatory"] ):
-                    print ("    mandatory dependency for        : ", end="")
-                    for dep in addons [name]["usedBy"]["mandatory"]:
-                        print ( dep, end=", " )
-                    print()
-            if "optional" in addons [name]["usedBy"]:
-                if 0 < len ( addons [name]["usedBy"]["optional"] ):
-                    print ("    optional  dependency for        : ", end="")
-                    for dep in addons [name]["usedBy"]["optional"]:
-                        print ( dep, end=", " )
-                    print()
+    for name, addon in matrix.addon_list.items():
+        print ( addon.get_title() )
+        closure = matrix.get_closure ( name )
+        missing = matrix.get_missing ( name )
+        print_name_list (
+            "    Satisfied mandatory dependencies:", closure["mandatory"] - missing["mandatory"]
+        )
+        print_name_list (
+            "    Satisfied optional  dependencies:", closure["optional"] - missing["optional"]
+        )
+        dependents = matrix.get_dependents ( name, transitive=False )
+        print_name_list ( "    mandatory dependency for        :", dependents["mandatory"] )
+        print_name_list ( "    optional  dependency for        :", dependents["optional"] )
     print()
 
 
 
-def print_complications ( addons ):
+def print_complications ( matrix ):
     """Print compiled complications to screen."""
     print ("Unsatisfied mandatory dependencies:")
-    for name in addons:
-        if "uses" in addons [ name ]:
-            if "mandatoryMissing" in addons [name]["uses"]:
-                if 0 < len ( addons [name]["uses"]["mandatoryMissing"] ):
-                    print (
-                        "* ",
-                        addons[name]["Title"],
-                        ": ",
-                        ", ".join( addons [name]["uses"]["mandatoryMissing"] )
-                    )
+    for name, addon in matrix.addon_list.items():
+        missing = matrix.get_missing ( name )
+        print_name_list ( f"*  {addon.get_title()} :", missing["mandatory"] )
     print()
     print ("Unsatisfied optional  dependencies:")
-    for name in addons:
-        if "uses" in addons [ name ]:
-            if "optionalMissing" in addons [name]["uses"]:
-                if 0 < len ( addons [name]["uses"]["optionalMissing"] ):
-                    print (
-                        "* ",
-                        addons[name]["Title"],
-                        ": ",
-                        ", ".join( addons [name]["uses"]["optionalMissing"] )
-                    )
+    for name, addon in matrix.addon_list.items():
+        missing = matrix.get_missing ( name )
+        print_name_list ( f"*  {addon.get_title()} :", missing["optional"] )
+    print()
+    print ("Unsatisfied version requirements:")
+    versions = matrix.check_version_constraints()
+    for entry in versions["unsatisfied"]:
+        print (
+            "* ", entry["addon"], ": needs", entry["dependency"],
+            f">= {entry['min_version']}" if entry["min_version"] is not None else "",
+            f"<= {entry['max_version']}" if entry["max_version"] is not None else "",
+            f"(installed: {entry['installed_version'] or 'no AddOnVersion'})",
+            "" if entry["mandatory"] else "[optional]"
+        )
+    for entry in versions["unparseable"]:
+        print ( "* ", entry["addon"], ": cannot compare version of", entry["dependency"] )
+    print()
+    print ("Conflicting version requirements:")
+    for name, entry in sorted ( matrix.find_version_conflicts().items() ):
+        if not entry["feasible"]:
+            minimums = ", ".join (
+                f"{conflict['addon']} (>= {conflict['min_version']})"
+                for conflict in entry["conflicts"]["minimums"]
+            )
+            maximums = ", ".join (
+                f"{conflict['addon']} (<= {conflict['max_version']})"
+                for conflict in entry["conflicts"]["maximums"]
+            )
+            print ( "* ", name, ":", minimums, "conflict with", maximums )
     print()
+    load_order = matrix.compute_load_order()
+    print ("Mandatory dependency cycles:")
+    for entry in load_order["cycles"]:
+        print ( "* ", " -> ".join ( entry["cycle"] ) )
+    print()
+    print ("Optional dependencies ignored to break cycles:")
+    for name, dependency in load_order["broken"]:
+        print ( "* ", name, ": loaded before", dependency )
+    print()
+    libraries = matrix.find_unused_libraries()
     print ("assumed libraries not used by any other addon:")
-    for name in addons:
-        if addons[name]["markedAsLibrary"]:
-            used = False
-            if "usedBy" in addons [ name ]:
-                if "mandatory" in addons [name]["usedBy"]:
-                    if 0 < len ( addons [name]["usedBy"]["mandatory"] ):
-                        used = True
-                if "optional" in addons [name]["usedBy"]:
-                    if 0 < len ( addons [name]["usedBy"]["optional"] ):
-                        used = True
-            if not used:
-                print ( "* ", addons[name]["Title"] )
+    for name in libraries["unused"]:
+        print ( "* ", matrix.addon_list [ name ].get_title() )
+    print()
+    print ("assumed libraries only used through optional dependencies:")
+    for name, user in sorted ( libraries["optional"].items() ):
+        print ( "* ", matrix.addon_list [ name ].get_title(), f"(kept for {user})" )
     print (
         "[please be aware that addons starting with 'lib' are detected as library, ",
         "even if they might not be a library]"
     )
     print()
 
+def print_library_usage ( usage ):
+    """Print libraries used without declaration and declared but unused ones."""
+    print ("Library usage in addon sources:")
+    for name, entry in usage.items():
+        print ( "* ", name )
+        print_name_list ( "    used, but not declared  :", entry["undeclared"] )
+        print_name_list ( "    declared, but not used  :", entry["unused"] )
+    print (
+        "[libraries are found by name only, references built at runtime ",
+        "or through another library are not detected]"
+    )
+    print()
+
+def format_size ( size ):
+    """return a byte count in readable units"""
+    for unit in ( "bytes", "KiB", "MiB" ):
+        if abs ( size ) < 1024:
+            return f"{size:,.0f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} GiB"
+
+def print_saved_variables ( report ):
+    """Print the SavedVariables files with their sizes, growth and owners."""
+    print ("SavedVariables files:")
+    for entry in report["files"]:
+        size = format_size ( entry["size"] )
+        if entry["growth"]:
+            sign = "+" if entry["growth"] > 0 else "-"
+            size += f", {sign}{format_size ( abs ( entry['growth'] ) )} since last run"
+        if entry["size"] > SAVED_VARIABLES_LARGE:
+            size += ", large"
+        if entry["orphan"]:
+            print ( "* ", entry["file"], f"({size}) : ORPHAN" )
+        elif not entry["owners"]:
+            print ( "* ", entry["file"], f"({size}) : game" )
+        else:
+            print ( "* ", entry["file"], f"({size}) :", ", ".join ( entry["owners"] ) )
+            print_name_list ( "    variables not declared by any addon:", entry["undeclared"] )
+    print()
+    print (
+        f"{len ( report['orphans'] )} orphaned files with {format_size ( report['orphan_size'] )},",
+        f"{format_size ( report['total_size'] )} in total"
+    )
+    print (
+        "[orphaned files belong to addons that are no longer installed, ",
+        "they can be deleted while the game is not running]"
+    )
+    print()
+
+def print_diff ( diff ):
+    """Print the differences between two installs to screen."""
+    print ("Added addons:")
+    for name in diff["added"]:
+        print ( "* ", name )
+    print()
+    print ("Removed addons:")
+    for name in diff["removed"]:
+        print ( "* ", name )
+    print()
+    print ("Version changes:")
+    for entry in diff["version_changes"]:
+        before, after = entry["version"]
+        before_key, after_key = entry["addon_version"]
+        print ( "* ", entry["addon"], f": {before} ({before_key}) -> {after} ({after_key})" )
+    print()
+    for dependency_type in ( "mandatory", "optional" ):
+        for change, label in ( ( "breaks", "Newly missing" ), ( "fixed", "No longer missing" ) ):
+            print ( f"{label} {dependency_type} dependencies:" )
+            for name, names in diff["missing"][ dependency_type ][ change ].items():
+                print_name_list ( f"*  {name} :", names )
+            print()
+    for change, label in ( ( "breaks", "Newly unsatisfied" ), ( "fixed", "No longer unsatisfied" ) ):
+        print ( f"{label} version requirements:" )
+        for entry in diff["versions"]["unsatisfied"][ change ]:
+            print (
+                "* ", entry["addon"], ": needs", entry["dependency"],
+                f">= {entry['min_version']}" if entry["min_version"] is not None else "",
+                f"<= {entry['max_version']}" if entry["max_version"] is not None else "",
+                f"(installed: {entry['installed_version'] or 'no AddOnVersion'})"
+            )
+        print()
+    for change, label in ( ( "breaks", "Newly conflicting" ), ( "fixed", "No longer conflicting" ) ):
+        print ( f"{label} version requirements:" )
+        for name in diff["versions"]["conflicts"][ change ]:
+            print ( "* ", name )
+        print()
+
+
+
+def parse_arguments ():
+    """parse command line arguments, defaults come from the constants above"""
+    parser = argparse.ArgumentParser ( description="Check dependencies in ESO addon folder." )
+    parser.add_argument ( "--root", default=ADDON_ROOT, help="addon folder to scan" )
+    parser.add_argument (
+        "--workers", type=int, default=PARSE_WORKERS,
+        help="number of parse processes, 0 uses one per cpu"
+    )
+    parser.add_argument (
+        "--no-cache", action="store_true", help="do not use the parse cache and snapshot files"
+    )
+    parser.add_argument (
+        "--jsonl", action="store_true",
+        help="stream one json record per addon as soon as it is known, then a summary"
+    )
+    parser.add_argument (
+        "--batch", nargs="+", metavar="ROOT",
+        help="analyze several addon folders, write one json record per folder and "
+             "an aggregate record, identical description files are parsed once"
+    )
+    parser.add_argument (
+        "--diff", nargs=2, metavar=( "BEFORE", "AFTER" ),
+        help="compare two addon folders, e.g. before and after an update"
+    )
+    parser.add_argument (
+        "--scan-sources", action="store_true",
+        help="search the lua and xml files of every addon for the names of installed "
+             "libraries and report undeclared and unused library dependencies"
+    )
+    parser.add_argument (
+        "--saved-variables", nargs="?", const="", metavar="FOLDER",
+        help="report sizes, growth and orphaned files of the SavedVariables folder "
+             "(default: next to the addon folder)"
+    )
+    parser.add_argument (
+        "--watch", action="store_true",
+        help="keep running and report again whenever description files change"
+    )
+    parser.add_argument (
+        "--serve", nargs="?", type=int, const=SERVER_PORT, metavar="PORT",
+        help=f"keep the results in memory and answer json queries on {SERVER_HOST} "
+             f"(default port {SERVER_PORT}): /deps?name=, /dependents?name=, "
+             "/missing?name=, /unused, /order, /versions, /status, /reload"
+    )
+    parser.add_argument (
+        "-v", "--verbose", action="count", default=0,
+        help=f"raise verbosity, repeat for more (default level {VERBOSITY})"
+    )
+    parser.add_argument (
+        "--profile", action="store_true",
+        help="print time spent per phase and counters at exit"
+    )
+    parser.add_argument (
+        "--profile-json", metavar="FILE", help="write the profile as json at exit"
+    )
+    return parser.parse_args()
+
+
+
+def configure_instrumentation ( verbosity, profile=False, profile_json=None ):
+    """route log output to stderr and register the profile dump at exit"""
+    levels = ( logging.ERROR, logging.WARNING, logging.INFO )
+    level = levels [ verbosity ] if verbosity < len ( levels ) else logging.DEBUG
+    logging.basicConfig ( level=level, format="%(levelname)s: %(message)s", stream=sys.stderr )
+
+    def dump_profile():
+        if profile:
+            print ( STATS.summary(), file=sys.stderr )
+        if profile_json is not None:
+            with open ( profile_json, "w", encoding="utf-8" ) as file:
+                file.write ( STATS.to_json() )
+
+    if profile or profile_json is not None:
+        atexit.register ( dump_profile )
+
+
+
 def main():
     """Check dependencies in ESO addon folder."""
-    file_list = find_valid_addon_description_files ( ADDON_ROOT )
-    addon_info = read_addon_info_files ( file_list )
-    matrix = DependencyMatrix ( addon_info )
+    arguments = parse_arguments()
+    configure_instrumentation (
+        VERBOSITY + arguments.verbose, arguments.profile, arguments.profile_json
+    )
+    workers = arguments.workers or None
+    if arguments.diff:
+        parsed = {}
+        before, after = (
+            read_shared_addon_info_files (
+                find_valid_addon_description_files ( root ), parsed, workers=workers
+            )
+            for root in arguments.diff
+        )
+        diff = DependencyMatrix ( before ).diff ( after )
+        with STATS.phase ( "report" ):
+            if arguments.jsonl:
+                print_jsonl ( [ dict ( diff, type="diff" ) ] )
+            else:
+                print_diff ( diff )
+        return
+    if arguments.batch:
+        with STATS.phase ( "report" ):
+            print_jsonl ( batch_records ( arguments.batch, workers=workers ) )
+        return
+    cache = None
+    if CACHE_FILE is not None and not arguments.no_cache:
+        cache = AddonCache ( CACHE_FILE )
+
+    try:
+        file_list = find_valid_addon_description_files ( arguments.root )
+        streaming = not (
+            arguments.watch or arguments.scan_sources or arguments.saved_variables is not None
+            or arguments.serve is not None
+        )
+        if arguments.jsonl and streaming:
+            parsed = iter_addon_info_files ( file_list, workers=workers, cache=cache )
+            with STATS.phase ( "report" ):
+                print_jsonl ( stream_addon_records ( parsed ) )
+            return
+
+        matrix = None
+        stamp = None
+        if SNAPSHOT_FILE is not None and not arguments.no_cache:
+            file_list = list ( file_list )
+            stamp = manifest_stamp ( file_list )
+            matrix = DependencyMatrix.load_snapshot ( SNAPSHOT_FILE, stamp )
+        if matrix is not None:
+            addon_info = matrix.addon_list
+        elif cache is None:
+            addon_info = read_addon_info_files ( file_list, workers=workers )
+        else:
+            addon_info = read_cached_addon_info_files ( file_list, cache, workers=workers )
+    finally:
+        if cache is not None:
+            cache.close()
+    if arguments.serve is not None:
+        watcher = watch_addon_folder ( arguments.root )
+        watcher.start ( addon_info )
+        server = AddonServer (
+            watcher, ( SERVER_HOST, arguments.serve ), interval=SERVER_POLL_INTERVAL
+        )
+        LOGGER.warning ( "serving %s on http://%s:%d", arguments.root, SERVER_HOST, arguments.serve )
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if arguments.watch:
+        watcher = watch_addon_folder ( arguments.root )
+        matrix = watcher.start ( addon_info )
+    elif matrix is None:
+        matrix = DependencyMatrix ( addon_info )
+        if stamp is not None:
+            matrix.save_snapshot ( SNAPSHOT_FILE, stamp )
+
+    with STATS.phase ( "report" ):
+        if arguments.jsonl:
+            print_jsonl ( watch_records ( matrix, matrix.addons, () ) )
+        else:
+            print_dependency_matrix ( matrix )
+            print_complications ( matrix )
+        if arguments.scan_sources:
+            usage = LibraryScanner ( DESCRIPTION_EXTENSIONS ).check ( matrix, workers=workers )
+            if arguments.jsonl:
+                print_jsonl ( [ { "type": "library usage", "addons": usage } ] )
+            else:
+                print_library_usage ( usage )
+        if arguments.saved_variables is not None:
+            folder = arguments.saved_variables or Path ( arguments.root ).parent / "SavedVariables"
+            report = SavedVariablesScanner ( folder, SAVED_VARIABLES_HISTORY ).check ( matrix )
+            if arguments.jsonl:
+                print_jsonl ( [ dict ( report, type="saved variables" ) ] )
+            else:
+                print_saved_variables ( report )
 
-    #print_dependency_matrix ( addon_info )
-    #print_complications ( addon_info )
+    if arguments.watch:
+        LOGGER.info ( "watching %s", arguments.root )
+        try:
+            report_changes ( watcher, arguments.jsonl )
+        except KeyboardInterrupt:
+            pass
 
 if __name__ == "__main__":
     main()
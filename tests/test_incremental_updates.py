@@ -0,0 +1,127 @@
+"""Check incremental matrix updates against full rebuilds
+
+    applies random sequences of add_addon and remove_addon calls to a
+    DependencyMatrix and compares every computed result with a matrix
+    built from scratch for the same addons. watch, simulate and diff all
+    rely on the incremental path giving the same answers.
+
+    usage: python -m pytest tests   (or python -m unittest discover tests)
+    """
+
+import random
+import sys
+import unittest
+from os.path import abspath, dirname
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+from classes.addon import Addon
+from classes.dependency_matrix import DependencyMatrix
+# pylint: enable=import-error,wrong-import-position
+
+# names addons are drawn from, the Missing ones are never installed
+NAMES = [ f"Addon{index}" for index in range ( 12 ) ] + [ f"LibPart{index}" for index in range ( 8 ) ]
+MISSING = [ "Missing0", "Missing1" ]
+SEQUENCES = 40
+STEPS = 12
+
+
+
+def random_addon ( rng, name ):
+    """return an addon with random dependencies, versions and constraints"""
+    def dependency_list ( count ):
+        entries = []
+        for target in rng.sample ( NAMES + MISSING, count ):
+            if rng.random() < 0.3:
+                target += f">={rng.randint ( 1, 5 )}"
+            entries.append ( target )
+        return " ".join ( entries )
+
+    lines = [ f"## Title: {name}", f"## AddOnVersion: {rng.randint ( 1, 5 )}" ]
+    mandatory = dependency_list ( rng.randint ( 0, 3 ) )
+    optional = dependency_list ( rng.randint ( 0, 2 ) )
+    if mandatory:
+        lines.append ( f"## DependsOn: {mandatory}" )
+    if optional:
+        lines.append ( f"## OptionalDependsOn: {optional}" )
+    addon = Addon()
+    addon.parse_data ( f"{name}.txt", "\n".join ( lines ).encode ( "ascii" ) )
+    return addon
+
+
+
+def computed_state ( matrix ):
+    """return every computed result of matrix as plain, comparable values"""
+    def names ( entry ):
+        return { dependency_type: sorted ( values ) for dependency_type, values in entry.items() }
+
+    def dependencies ( entry ):
+        return {
+            dependency_type: sorted ( ( dep.to_dict() for dep in deps ), key=repr )
+            for dependency_type, deps in entry.items()
+        }
+
+    known = set ( matrix.addon_list ) | set ( MISSING )
+    return {
+        'installed': sorted ( matrix.addon_list ),
+        'closure': { name: names ( matrix.get_closure ( name ) ) for name in matrix.addon_list },
+        'missing': { name: names ( matrix.get_missing ( name ) ) for name in matrix.addon_list },
+        'reduced': {
+            name: dependencies ( matrix.get_dependencies ( name ) ) for name in matrix.addon_list
+        },
+        'dependents': {
+            name: names ( matrix.get_dependents ( name ) ) for name in sorted ( known )
+        },
+        'direct_dependents': {
+            name: names ( matrix.get_dependents ( name, transitive=False ) )
+            for name in sorted ( known )
+        },
+        'conflicts': {
+            name: {
+                dependency_type: sorted (
+                    ( repr ( dict ( conflict, conflicting=conflict['conflicting'].to_dict() ) )
+                      for conflict in entries )
+                )
+                for dependency_type, entries in types.items()
+            }
+            for name, types in matrix.get_conflicts().items()
+        }
+    }
+
+
+
+class IncrementalUpdateTest ( unittest.TestCase ):
+    """incremental updates must match a full rebuild after every step"""
+
+    def test_random_sequences ( self ):
+        """add, replace and remove addons in random order"""
+        for seed in range ( SEQUENCES ):
+            rng = random.Random ( seed )
+            installed = {
+                name: random_addon ( rng, name )
+                for name in rng.sample ( NAMES, rng.randint ( 4, len ( NAMES ) ) )
+            }
+            matrix = DependencyMatrix ( dict ( installed ) )
+            for step in range ( STEPS ):
+                name = rng.choice ( NAMES )
+                if name in installed and rng.random() < 0.5:
+                    matrix.remove_addon ( name )
+                    del installed [ name ]
+                    action = f"remove {name}"
+                else:
+                    installed [ name ] = random_addon ( rng, name )
+                    matrix.add_addon ( installed [ name ] )
+                    action = f"add {name}"
+                with self.subTest ( seed=seed, step=step, action=action ):
+                    self.assertEqual (
+                        computed_state ( matrix ),
+                        computed_state ( DependencyMatrix ( dict ( installed ) ) )
+                    )
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Check matrices loaded from a snapshot against computed ones
+
+    a loaded matrix decodes reachability rows, closures and dependents only
+    when they are used. it must give the same answers as the matrix it was
+    written from, also after incremental updates and in simulations.
+
+    usage: python -m pytest tests   (or python -m unittest discover tests)
+    """
+
+import random
+import sys
+import tempfile
+import unittest
+from os.path import abspath, dirname, join
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+from classes.dependency_matrix import DependencyMatrix
+from test_incremental_updates import NAMES, computed_state, random_addon
+# pylint: enable=import-error,wrong-import-position
+
+INSTALLS = 30
+STEPS = 6
+STAMP = b"0123456789abcdef"
+
+
+
+class MatrixSnapshotTest ( unittest.TestCase ):
+    """a loaded matrix must match the computed one"""
+
+    def test_random_installs ( self ):
+        """load, simulate and update random installs"""
+        with tempfile.TemporaryDirectory() as folder:
+            filename = join ( folder, "matrix.snapshot" )
+            for seed in range ( INSTALLS ):
+                rng = random.Random ( seed )
+                installed = {
+                    name: random_addon ( rng, name )
+                    for name in rng.sample ( NAMES, rng.randint ( 4, len ( NAMES ) ) )
+                }
+                matrix = DependencyMatrix ( dict ( installed ) )
+                matrix.save_snapshot ( filename, STAMP )
+                self.assertIsNone ( DependencyMatrix.load_snapshot ( filename, b"x" * 16 ) )
+                loaded = DependencyMatrix.load_snapshot ( filename, STAMP )
+                with self.subTest ( seed=seed, action="load" ):
+                    self.assertEqual ( computed_state ( loaded ), computed_state ( matrix ) )
+
+                # simulate and update fresh copies, so nothing has been decoded before
+                name = rng.choice ( sorted ( installed ) )
+                with self.subTest ( seed=seed, action=f"simulate {name}" ):
+                    self.assertEqual (
+                        repr ( DependencyMatrix.load_snapshot ( filename, STAMP ).simulate (
+                            remove=[ name ]
+                        ) ),
+                        repr ( matrix.simulate ( remove=[ name ] ) )
+                    )
+
+                loaded = DependencyMatrix.load_snapshot ( filename, STAMP )
+                for step in range ( STEPS ):
+                    name = rng.choice ( NAMES )
+                    if name in installed and rng.random() < 0.5:
+                        loaded.remove_addon ( name )
+                        del installed [ name ]
+                        action = f"remove {name}"
+                    else:
+                        installed [ name ] = random_addon ( rng, name )
+                        loaded.add_addon ( installed [ name ] )
+                        action = f"add {name}"
+                    with self.subTest ( seed=seed, step=step, action=action ):
+                        self.assertEqual (
+                            computed_state ( loaded ),
+                            computed_state ( DependencyMatrix ( dict ( installed ) ) )
+                        )
+
+
+
+if __name__ == "__main__":
+    unittest.main()
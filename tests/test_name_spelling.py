@@ -0,0 +1,85 @@
+"""Check reports when a dependency is spelled differently than the addon
+
+    names are interned casefolded and keep the first spelling seen. when a
+    DependsOn entry is read before the addon itself, that spelling differs
+    from the installed name, and reports must still use the installed one.
+
+    usage: python -m pytest tests   (or python -m unittest discover tests)
+    """
+
+import contextlib
+import io
+import sys
+import unittest
+from os.path import abspath, dirname
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+import dependencies
+from classes.addon import Addon
+from classes.dependency_matrix import DependencyMatrix
+# pylint: enable=import-error,wrong-import-position
+
+
+
+def parsed_addon ( name, text ):
+    """return an addon parsed from the text of its description file"""
+    addon = Addon()
+    addon.parse_data ( f"{name}.txt", text.encode ( "ascii" ) )
+    return addon
+
+
+
+class NameSpellingTest ( unittest.TestCase ):
+    """libraries depended on with another spelling are reported by their own name"""
+
+    def setUp ( self ):
+        # the dependent is parsed first, so "libspellingbar" is interned first
+        main = parsed_addon ( "SpellingMain", "## OptionalDependsOn: libspellingbar\n" )
+        user = parsed_addon ( "SpellingUser", "## DependsOn: LIBSPELLINGBAZ\n" )
+        bar = parsed_addon ( "LibSpellingBar", "## Title: LibSpellingBar\n" )
+        baz = parsed_addon ( "LibSpellingBaz", "## Title: LibSpellingBaz\n" )
+        self.matrix = DependencyMatrix ( {
+            addon.get_name(): addon for addon in ( main, user, bar, baz )
+        } )
+
+
+    def test_unused_libraries ( self ):
+        """kept libraries and their users use the installed names"""
+        libraries = self.matrix.find_unused_libraries()
+        self.assertEqual ( libraries["unused"], [] )
+        self.assertEqual ( libraries["mandatory"], { "LibSpellingBaz": "SpellingUser" } )
+        self.assertEqual ( libraries["optional"], { "LibSpellingBar": "SpellingMain" } )
+
+
+    def test_version_conflicts ( self ):
+        """conflicting requirements are reported under the installed name"""
+        low = parsed_addon ( "SpellingLow", "## DependsOn: libspellingqux<=1\n" )
+        high = parsed_addon ( "SpellingHigh", "## DependsOn: libspellingqux>=2\n" )
+        qux = parsed_addon ( "LibSpellingQux", "## AddOnVersion: 1\n" )
+        self.matrix.add_addon ( low )
+        self.matrix.add_addon ( qux )
+        self.assertEqual (
+            self.matrix.simulate ( add=[ high ] )["versions"]["conflicts"]["breaks"],
+            [ "LibSpellingQux" ]
+        )
+        self.matrix.add_addon ( high )
+        conflicts = self.matrix.find_version_conflicts()
+        self.assertIn ( "LibSpellingQux", conflicts )
+        self.assertFalse ( conflicts["LibSpellingQux"]["feasible"] )
+
+
+    def test_report ( self ):
+        """the default report prints without failing on the other spelling"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout ( output ):
+            dependencies.print_complications ( self.matrix )
+        self.assertIn ( "LibSpellingBar (kept for SpellingMain)", output.getvalue() )
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Check batched depth queries against a plain breadth first search
+
+    query_depths walks bit packed adjacency rows for all queried addons
+    at once. the result must match a simple search per addon.
+
+    usage: python -m pytest tests   (or python -m unittest discover tests)
+    """
+
+import random
+import sys
+import unittest
+from collections import deque
+from os.path import abspath, dirname
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+from classes.dependency_matrix import DependencyMatrix
+from test_incremental_updates import NAMES, random_addon
+# pylint: enable=import-error,wrong-import-position
+
+INSTALLS = 100
+
+
+
+def search_depths ( addon_list, name, max_depth, optional ):
+    """return name -> depth of everything reachable from name, one search"""
+    depths = { name.casefold(): 0 }
+    pending = deque ( [ name ] )
+    while pending:
+        current = pending.popleft()
+        addon = addon_list.get ( current )
+        depth = depths [ current.casefold() ]
+        if addon is None or depth == max_depth:
+            continue
+        dependencies = addon.get_depends_on()
+        if optional:
+            dependencies = dependencies + addon.get_optional_depends_on()
+        for dep in dependencies:
+            key = dep.get_name().casefold()
+            if key not in depths:
+                depths [ key ] = depth + 1
+                pending.append ( dep.get_name() )
+    return { key: depth for key, depth in depths.items() if key != name.casefold() }
+
+
+
+class QueryDepthsTest ( unittest.TestCase ):
+    """query_depths must match one breadth first search per addon"""
+
+    def test_random_installs ( self ):
+        """compare every installed addon of random installs, with and without depth limit"""
+        for seed in range ( INSTALLS ):
+            rng = random.Random ( seed )
+            installed = {
+                name: random_addon ( rng, name )
+                for name in rng.sample ( NAMES, rng.randint ( 3, len ( NAMES ) ) )
+            }
+            matrix = DependencyMatrix ( dict ( installed ) )
+            for max_depth in ( 2, matrix.SCAN_DEPTH ):
+                result = matrix.query_depths ( sorted ( installed ), max_depth )
+                for name in installed:
+                    mandatory = search_depths ( installed, name, max_depth, False )
+                    reachable = search_depths ( installed, name, max_depth, True )
+                    expected = {
+                        'mandatory': mandatory,
+                        'optional': {
+                            key: depth for key, depth in reachable.items() if key not in mandatory
+                        }
+                    }
+                    with self.subTest ( seed=seed, name=name, max_depth=max_depth ):
+                        self.assertEqual (
+                            {
+                                dependency_type: {
+                                    key.casefold(): depth for key, depth in depths.items()
+                                }
+                                for dependency_type, depths in result [ name ].items()
+                            },
+                            expected
+                        )
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Check that simulated changes are reported in name order
+
+    --diff and --simulate print the addons whose missing dependencies
+    break or get fixed in the order simulate returns them.
+
+    usage: python -m pytest tests   (or python -m unittest discover tests)
+    """
+
+import random
+import sys
+import unittest
+from os.path import abspath, dirname
+
+# make the repository importable when run from anywhere
+sys.path.insert ( 0, dirname ( dirname ( abspath ( __file__ ) ) ) )
+
+# pamper pylint stupidity
+# pylint: disable=import-error,wrong-import-position
+from classes.dependency_matrix import DependencyMatrix
+from test_incremental_updates import NAMES, random_addon
+# pylint: enable=import-error,wrong-import-position
+
+INSTALLS = 60
+
+
+
+class SimulateOrderTest ( unittest.TestCase ):
+    """breaks and fixes must be keyed in casefolded name order"""
+
+    def test_random_installs ( self ):
+        """remove some addons and add others to random installs"""
+        for seed in range ( INSTALLS ):
+            rng = random.Random ( seed )
+            installed = {
+                name: random_addon ( rng, name )
+                for name in rng.sample ( NAMES, rng.randint ( 4, len ( NAMES ) ) )
+            }
+            matrix = DependencyMatrix ( dict ( installed ) )
+            remove = rng.sample ( sorted ( installed ), 2 )
+            add = [
+                random_addon ( rng, name )
+                for name in rng.sample ( [ name for name in NAMES if name not in installed ] or NAMES, 1 )
+            ]
+            missing = matrix.simulate ( remove=remove, add=add )["missing"]
+            for dependency_type, changes in missing.items():
+                for change, entries in changes.items():
+                    with self.subTest ( seed=seed, dependency_type=dependency_type, change=change ):
+                        self.assertEqual ( list ( entries ), sorted ( entries, key=str.casefold ) )
+
+
+
+if __name__ == "__main__":
+    unittest.main()